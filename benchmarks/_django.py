@@ -0,0 +1,41 @@
+"""
+Shared bootstrap for the benchmark scripts.
+
+Benchmarks never touch the development database: unless BENCH_DATABASE_URL
+points somewhere else they run against a fresh SQLite file in a temporary
+directory, migrated from scratch on start-up.
+"""
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup():
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    database_url = os.environ.get('BENCH_DATABASE_URL')
+    if not database_url:
+        database_url = f"sqlite:///{Path(tempfile.mkdtemp(prefix='balance-jar-bench-')) / 'bench.sqlite3'}"
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'www.settings')
+    os.environ.setdefault('DEBUG', 'False')
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command('migrate', verbosity=0, interactive=False)
+    return database_url
+
+
+def write_report(path, report):
+    """Write ``report`` as JSON to ``path`` (or stdout when path is '-')"""
+    payload = json.dumps(report, indent=2, default=str)
+    if path in (None, '-'):
+        print(payload)
+    else:
+        Path(path).write_text(payload + '\n')
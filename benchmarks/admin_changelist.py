@@ -0,0 +1,141 @@
+"""
+Admin changelist benchmark.
+
+Seeds a scratch database with ``manage.py seed_ledger`` (1M transactions by
+default, unless ``--skip-seed`` is given together with BENCH_DATABASE_URL)
+and renders the Transaction and Jar admin pages as a superuser. Each page is
+measured twice: with the admin as configured in ``core/admin.py`` and with
+the stock options it replaced (``__str__`` without related rows, full result
+counts, facets, unbounded related filters and ``<select>`` widgets).
+Latency percentiles and query counts are written as JSON:
+
+    python -m benchmarks.admin_changelist --transactions 1000000 --iterations 5
+"""
+import argparse
+import io
+import time
+
+from benchmarks import _django
+from benchmarks.views import STATIC_STORAGES, git_revision, measure
+
+STOCK_OPTIONS = {
+    'Transaction': {
+        'list_filter': ['transaction_type', 'created_at', 'updated_at', 'created_by'],
+        'autocomplete_fields': [],
+    },
+    'Jar': {
+        'list_filter': ['account', 'owner', 'created_at', 'updated_at'],
+        'autocomplete_fields': [],
+    },
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--transactions', type=int, default=1_000_000)
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-seed', action='store_true', help="Benchmark the existing BENCH_DATABASE_URL data")
+    parser.add_argument('--mode', action='append', choices=['tuned', 'stock'], dest='modes')
+    parser.add_argument('--output', default='-', help="JSON report path, '-' for stdout")
+    return parser.parse_args()
+
+
+def stock(model_admin, options):
+    """Put ``model_admin`` back on Django's defaults (and the listed options) for one run"""
+    from django.contrib import admin
+    from django.core.paginator import Paginator
+
+    defaults = {
+        'list_select_related': False,
+        'show_full_result_count': True,
+        'show_facets': admin.ShowFacets.ALLOW,
+        'paginator': Paginator,
+        'date_hierarchy': None,
+        'get_queryset': lambda request: admin.ModelAdmin.get_queryset(model_admin, request),
+        **options,
+    }
+    saved = {name: model_admin.__dict__[name] for name in defaults if name in model_admin.__dict__}
+    for name, value in defaults.items():
+        setattr(model_admin, name, value)
+
+    def restore():
+        for name in defaults:
+            model_admin.__dict__.pop(name, None)
+        model_admin.__dict__.update(saved)
+    return restore
+
+
+def pages():
+    from django.urls import reverse
+    from core.models import Transaction
+
+    newest = Transaction.objects.order_by('-created_at', '-pk').first()
+    changelist = reverse('admin:core_transaction_changelist')
+    return [
+        ('transaction_changelist', changelist),
+        ('transaction_changelist_filtered', changelist + '?transaction_type__exact=TRANSFER'),
+        ('transaction_changelist_day', changelist + newest.created_at.strftime('?created_at__year=%Y&created_at__month=%m&created_at__day=%d')),
+        ('transaction_change', reverse('admin:core_transaction_change', args=[newest.pk])),
+        ('jar_changelist', reverse('admin:core_jar_changelist')),
+    ]
+
+
+def main():
+    args = parse_args()
+    database_url = _django.setup()
+    from django.contrib import admin
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import override_settings
+    from core.models import Jar, Transaction
+
+    if not args.skip_seed:
+        started = time.perf_counter()
+        call_command('seed_ledger', users=args.users, transactions=args.transactions, seed=args.seed, stdout=io.StringIO())
+        seed_seconds = round(time.perf_counter() - started, 1)
+    else:
+        seed_seconds = None
+    if connection.vendor == 'postgresql':
+        # Fresh planner statistics, as autovacuum would have produced by now
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    superuser = User.objects.filter(username='bench-admin').first() or User.objects.create_superuser(
+        'bench-admin', 'bench-admin@example.com', 'bench-admin',
+    )
+    client = Client()
+    client.force_login(superuser)
+    model_admins = {'Transaction': admin.site.get_model_admin(Transaction), 'Jar': admin.site.get_model_admin(Jar)}
+
+    results = {}
+    with override_settings(ALLOWED_HOSTS=['*'], STORAGES=STATIC_STORAGES, DEBUG=False):
+        for mode in args.modes or ['tuned', 'stock']:
+            restores = []
+            if mode == 'stock':
+                restores = [stock(model_admins[name], options) for name, options in STOCK_OPTIONS.items()]
+            try:
+                results[mode] = {
+                    name: measure(client, 'get', url, None, args.iterations, cold=False) for name, url in pages()
+                }
+            finally:
+                for restore in restores:
+                    restore()
+
+    _django.write_report(args.output, {
+        'benchmark': 'admin_changelist',
+        'revision': git_revision(),
+        'database': connection.vendor,
+        'database_url': database_url.split('@')[-1],
+        'transactions_total': Transaction.objects.count(),
+        'users_total': User.objects.count(),
+        'seed_seconds': seed_seconds,
+        'modes': results,
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Multi-threaded stress benchmark for balance posting.
+
+Several threads hammer a small set of jars with random incomes, expenses and
+transfers through ``Transaction.save``. Afterwards every jar balance is
+checked against its opening balance plus the committed transaction rows, and
+the user rollup against the sum of the jars, so lost updates, overdrafts or
+half-applied transfers show up as drift.
+
+    python -m benchmarks.posting_concurrency --threads 8 --operations 250
+"""
+import argparse
+import random
+import threading
+import time
+from decimal import Decimal
+
+from benchmarks import _django
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--operations', type=int, default=250, help="operations per thread")
+    parser.add_argument('--jars', type=int, default=4)
+    parser.add_argument('--opening-balance', type=Decimal, default=Decimal('500.00'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='-', help="JSON report path, '-' for stdout")
+    return parser.parse_args()
+
+
+def create_fixture(jar_count, opening_balance):
+    from django.contrib.auth.models import User
+    from core.models import Account, Jar, Owner
+
+    user = User.objects.create_user(f'bench-{time.time_ns()}', password='bench')
+    account = Account.objects.create(name='Bench', account_number='0000', created_by=user)
+    owner = Owner.objects.get(created_by=user, is_self=True)
+    jars = [Jar.objects.get(account=account)]
+    jars[0].add_money(opening_balance)
+    for index in range(1, jar_count):
+        jars.append(Jar.objects.create(name=f'Jar {index}', account=account, balance=opening_balance, owner=owner))
+    return user, [jar.pk for jar in jars]
+
+
+def worker(user, jar_ids, operations, seed, stats, lock):
+    from django.db import OperationalError, connection
+    from core.models import Jar, Transaction
+
+    rng = random.Random(seed)
+    jars = {jar.pk: jar for jar in Jar.objects.filter(pk__in=jar_ids).select_related('account')}
+    committed = rejected = errors = 0
+    try:
+        for _ in range(operations):
+            kind = rng.choice(['INCOMING', 'OUTGOING', 'TRANSFER', 'TRANSFER'])
+            source, destination = rng.sample(jar_ids, 2)
+            txn = Transaction(
+                jar=jars[source],
+                transaction_type=kind,
+                amount=Decimal(rng.randint(1, 9000)) / 100,
+                source_destination='bench',
+                created_by=user,
+            )
+            if kind == 'TRANSFER':
+                txn.destination_jar = jars[destination]
+            try:
+                txn.save()
+                committed += 1
+            except ValueError:
+                rejected += 1
+            except OperationalError:
+                errors += 1
+    finally:
+        connection.close()
+    with lock:
+        stats['committed'] += committed
+        stats['rejected'] += rejected
+        stats['errors'] += errors
+
+
+def check_drift(user, jar_ids, opening_balance):
+    from django.db.models import Q, Sum
+    from core.models import Jar, Transaction, UserRollup
+
+    drift = []
+    for jar in Jar.objects.filter(pk__in=jar_ids):
+        credits = Transaction.objects.filter(
+            Q(jar=jar, transaction_type='INCOMING') | Q(destination_jar=jar, transaction_type='TRANSFER')
+        ).aggregate(total=Sum('amount'))['total'] or 0
+        debits = Transaction.objects.filter(
+            jar=jar, transaction_type__in=['OUTGOING', 'TRANSFER']
+        ).aggregate(total=Sum('amount'))['total'] or 0
+        expected = opening_balance + credits - debits
+        if jar.balance != expected or jar.balance < 0:
+            drift.append({'jar': jar.pk, 'balance': jar.balance, 'expected': expected})
+
+    jar_total = Jar.objects.filter(pk__in=jar_ids).aggregate(total=Sum('balance'))['total']
+    rollup_total = UserRollup.objects.get(user=user).balance
+    if jar_total != rollup_total:
+        drift.append({'rollup': user.pk, 'balance': rollup_total, 'expected': jar_total})
+    return drift
+
+
+def main():
+    args = parse_args()
+    database_url = _django.setup()
+    from django.db import connection
+
+    user, jar_ids = create_fixture(args.jars, args.opening_balance)
+    connection.close()
+
+    stats = {'committed': 0, 'rejected': 0, 'errors': 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=worker, args=(user, jar_ids, args.operations, args.seed + index, stats, lock))
+        for index in range(args.threads)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    drift = check_drift(user, jar_ids, args.opening_balance)
+    _django.write_report(args.output, {
+        'benchmark': 'posting_concurrency',
+        'database': connection.vendor,
+        'database_url': database_url.split('@')[-1],
+        'threads': args.threads,
+        'operations': args.threads * args.operations,
+        'seconds': round(elapsed, 3),
+        'committed_per_second': round(stats['committed'] / elapsed, 1) if elapsed else None,
+        **stats,
+        'drift': drift,
+    })
+    raise SystemExit(1 if drift else 0)
+
+
+if __name__ == '__main__':
+    main()
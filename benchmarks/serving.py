@@ -0,0 +1,206 @@
+"""
+Sync (WSGI) vs async (ASGI) serving benchmark.
+
+Seeds a scratch database, then starts gunicorn twice against it: once with
+sync workers on ``www.wsgi`` and once with uvicorn workers on ``www.asgi``
+and ASYNC_VIEWS=True. Each stack is driven with the same concurrent load on
+the read-heavy pages as the busiest seeded user; latency percentiles,
+throughput and error counts are written as JSON:
+
+    python -m benchmarks.serving --transactions 100000 --concurrency 32
+"""
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import _django
+
+STACKS = {
+    'sync': {
+        'app': 'www.wsgi:application',
+        'args': ['--worker-class', 'sync'],
+        'env': {'ASYNC_VIEWS': 'False'},
+    },
+    'async': {
+        'app': 'www.asgi:application',
+        'args': ['--worker-class', 'uvicorn_worker.UvicornWorker'],
+        'env': {'ASYNC_VIEWS': 'True'},
+    },
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--transactions', type=int, default=20_000)
+    parser.add_argument('--workers', type=int, default=3, help="gunicorn workers per stack")
+    parser.add_argument('--concurrency', type=int, default=16, help="simultaneous client connections")
+    parser.add_argument('--requests', type=int, default=200, help="requests per page per stack")
+    parser.add_argument('--stack', action='append', choices=sorted(STACKS), dest='stacks')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='-', help="JSON report path, '-' for stdout")
+    return parser.parse_args()
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def session_cookie(user):
+    """Log ``user`` in by writing a session row both stacks can read"""
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.sessions.backends.db import SessionStore
+
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return f"sessionid={session.session_key}"
+
+
+def pages(user):
+    from django.urls import reverse
+    from core.models import Account, Jar
+
+    account = Account.objects.filter(created_by=user).first()
+    jar = Jar.objects.filter(account__created_by=user).order_by('-balance').first()
+    return [
+        ('home', reverse('home')),
+        ('account_detail_view', reverse('account_detail', args=[account.pk])),
+        ('all_transactions', reverse('all_transactions')),
+        ('all_transactions_filtered', reverse('all_transactions') + '?type=OUTGOING'),
+        ('jar_transactions', reverse('jar_transactions', args=[jar.pk])),
+    ]
+
+
+def start_server(stack, database_url, cache_dir, workers):
+    port = free_port()
+    env = {
+        **os.environ,
+        'DATABASE_URL': database_url,
+        'DEBUG': 'False',
+        'ALLOWED_HOSTS': '127.0.0.1',
+        'CACHE_BACKEND': 'file',
+        'CACHE_DIR': cache_dir,
+        **STACKS[stack]['env'],
+    }
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', STACKS[stack]['app'], *STACKS[stack]['args'],
+         '--workers', str(workers), '--bind', f'127.0.0.1:{port}', '--log-level', 'warning'],
+        cwd=_django.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{stack} server exited with status {process.returncode}")
+        try:
+            urllib.request.urlopen(base_url + '/accounts/login/', timeout=1)
+            return process, base_url
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{stack} server did not start")
+
+
+def fetch(url, cookie):
+    request = urllib.request.Request(url, headers={'Cookie': cookie})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as error:
+        status = error.code
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        status = None
+    return (time.perf_counter() - started) * 1000, status
+
+
+def load(url, cookie, total, concurrency):
+    # One warm-up request so template loading and cache population are not measured
+    fetch(url, cookie)
+    lock = threading.Lock()
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency, status in pool.map(lambda _: fetch(url, cookie), range(total)):
+            with lock:
+                if status == 200:
+                    latencies.append(latency)
+                else:
+                    errors += 1
+    elapsed = time.perf_counter() - started
+    report = {'requests': total, 'errors': errors, 'requests_per_second': round(total / elapsed, 1)}
+    if latencies:
+        report['latency_ms'] = {
+            'p50': round(percentile(latencies, 0.50), 2),
+            'p90': round(percentile(latencies, 0.90), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'mean': round(statistics.fmean(latencies), 2),
+            'max': round(max(latencies), 2),
+        }
+    return report
+
+
+def main():
+    args = parse_args()
+    database_url = _django.setup()
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection
+    from django.db.models import Count
+
+    call_command('seed_ledger', users=args.users, transactions=args.transactions, seed=args.seed,
+                 stdout=open(os.devnull, 'w'))
+    user = User.objects.annotate(n=Count('account__jar__transactions')).order_by('-n').first()
+    cookie = session_cookie(user)
+    targets = pages(user)
+    vendor = connection.vendor
+    connection.close()
+
+    results = {}
+    for stack in args.stacks or ['sync', 'async']:
+        cache_dir = tempfile.mkdtemp(prefix=f'balance-jar-cache-{stack}-')
+        process, base_url = start_server(stack, database_url, cache_dir, args.workers)
+        try:
+            results[stack] = {
+                name: load(base_url + path, cookie, args.requests, args.concurrency)
+                for name, path in targets
+            }
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    _django.write_report(args.output, {
+        'benchmark': 'serving',
+        'database': vendor,
+        'database_url': database_url.split('@')[-1],
+        'transactions_total': args.transactions,
+        'workers': args.workers,
+        'concurrency': args.concurrency,
+        'stacks': results,
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Concurrent-writer benchmark for the SQLite connection settings.
+
+Runs the same workload twice, each time against a fresh SQLite file: once
+with SQLite's defaults (rollback journal, deferred transactions) and once with
+the OPTIONS from ``www/settings.py`` (WAL, IMMEDIATE transactions,
+busy_timeout, synchronous=NORMAL, mmap). Writer threads post random incomes,
+expenses and transfers through ``Transaction.save`` while reader threads
+page through the ledger, the way gunicorn threads share one file in
+production. Reports throughput, write latency and "database is locked"
+errors per mode:
+
+    python -m benchmarks.sqlite_writers --writers 8 --readers 4 --operations 200
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from benchmarks import _django
+from benchmarks.posting_concurrency import check_drift, create_fixture
+from benchmarks.serving import percentile
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--operations', type=int, default=200, help="transactions per writer")
+    parser.add_argument('--jars', type=int, default=8)
+    parser.add_argument('--opening-balance', type=Decimal, default=Decimal('500.00'))
+    parser.add_argument('--mode', action='append', choices=['default', 'tuned'], dest='modes')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='-', help="JSON report path, '-' for stdout")
+    return parser.parse_args()
+
+
+def use_database(path, options):
+    """Point the default connection at a new SQLite file with ``options`` and migrate it"""
+    from django.core.management import call_command
+    from django.db import connections
+
+    connections.close_all()
+    # Connections created by later threads read this same dict
+    settings_dict = connections.settings['default']
+    settings_dict['NAME'] = str(path)
+    settings_dict['OPTIONS'] = dict(options)
+    call_command('migrate', verbosity=0, interactive=False)
+
+
+def writer(user, jar_ids, operations, seed, stats, lock):
+    from django.db import OperationalError, connection
+    from core.models import Jar, Transaction
+
+    rng = random.Random(seed)
+    jars = {jar.pk: jar for jar in Jar.objects.filter(pk__in=jar_ids).select_related('account')}
+    latencies, committed, rejected, errors = [], 0, 0, 0
+    try:
+        for _ in range(operations):
+            kind = rng.choice(['INCOMING', 'OUTGOING', 'TRANSFER'])
+            source, destination = rng.sample(jar_ids, 2)
+            txn = Transaction(
+                jar=jars[source],
+                transaction_type=kind,
+                amount=Decimal(rng.randint(1, 9000)) / 100,
+                source_destination='bench',
+                created_by=user,
+            )
+            if kind == 'TRANSFER':
+                txn.destination_jar = jars[destination]
+            started = time.perf_counter()
+            try:
+                txn.save()
+                committed += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+            except ValueError:
+                rejected += 1
+            except OperationalError:
+                errors += 1
+    finally:
+        connection.close()
+    with lock:
+        stats['latencies'].extend(latencies)
+        stats['committed'] += committed
+        stats['rejected'] += rejected
+        stats['write_errors'] += errors
+
+
+def reader(user, done, stats, lock):
+    from django.db import OperationalError, connection
+    from core.models import Transaction
+    from core.pagination import paginate
+
+    reads = errors = 0
+    transactions = Transaction.objects.filter(jar__account__created_by=user).select_related('jar', 'destination_jar')
+    try:
+        while not done.is_set():
+            try:
+                len(paginate(transactions).object_list)
+                reads += 1
+            except OperationalError:
+                errors += 1
+    finally:
+        connection.close()
+    with lock:
+        stats['reads'] += reads
+        stats['read_errors'] += errors
+
+
+def run(args, path, options):
+    from django.db import connection
+
+    use_database(path, options)
+    user, jar_ids = create_fixture(args.jars, args.opening_balance)
+    journal_mode = connection.cursor().execute('PRAGMA journal_mode').fetchone()[0]
+    connection.close()
+
+    stats = {'latencies': [], 'committed': 0, 'rejected': 0, 'write_errors': 0, 'reads': 0, 'read_errors': 0}
+    lock, done = threading.Lock(), threading.Event()
+    writers = [
+        threading.Thread(target=writer, args=(user, jar_ids, args.operations, args.seed + index, stats, lock))
+        for index in range(args.writers)
+    ]
+    readers = [threading.Thread(target=reader, args=(user, done, stats, lock)) for _ in range(args.readers)]
+    started = time.perf_counter()
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    latencies = stats.pop('latencies')
+    report = {
+        'journal_mode': journal_mode,
+        'options': options,
+        'seconds': round(elapsed, 3),
+        'committed_per_second': round(stats['committed'] / elapsed, 1) if elapsed else None,
+        'reads_per_second': round(stats['reads'] / elapsed, 1) if elapsed else None,
+        **stats,
+        'drift': check_drift(user, jar_ids, args.opening_balance),
+    }
+    if latencies:
+        report['write_latency_ms'] = {
+            'p50': round(percentile(latencies, 0.50), 2),
+            'p90': round(percentile(latencies, 0.90), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'mean': round(statistics.fmean(latencies), 2),
+            'max': round(max(latencies), 2),
+        }
+    connection.close()
+    return report
+
+
+def main():
+    args = parse_args()
+    _django.setup()
+    from django.db import connections
+
+    if connections['default'].vendor != 'sqlite':
+        raise SystemExit("sqlite_writers compares SQLite settings; unset BENCH_DATABASE_URL or point it at SQLite")
+
+    modes = {
+        'default': {},
+        'tuned': dict(connections.settings['default']['OPTIONS']),
+    }
+    directory = Path(tempfile.mkdtemp(prefix='balance-jar-writers-'))
+    results = {
+        mode: run(args, directory / f'{mode}.sqlite3', modes[mode])
+        for mode in args.modes or ['default', 'tuned']
+    }
+    _django.write_report(args.output, {
+        'benchmark': 'sqlite_writers',
+        'writers': args.writers,
+        'readers': args.readers,
+        'operations': args.writers * args.operations,
+        'modes': results,
+    })
+
+
+if __name__ == '__main__':
+    main()
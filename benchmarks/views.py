@@ -0,0 +1,171 @@
+"""
+View-level benchmark suite.
+
+Seeds a scratch database with ``manage.py seed_ledger`` (unless
+``--skip-seed`` is given together with BENCH_DATABASE_URL) and drives the
+main views through the Django test client as the busiest seeded user.
+Latency percentiles, query counts and peak Python memory per view are
+written as JSON, so runs can be compared across commits:
+
+    python -m benchmarks.views --transactions 100000 --output bench-100k.json
+"""
+import argparse
+import io
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from benchmarks import _django
+
+STATIC_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--transactions', type=int, default=10_000, help="e.g. 10000, 100000 or 1000000")
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-seed', action='store_true', help="Benchmark the existing BENCH_DATABASE_URL data")
+    parser.add_argument('--cold', action='store_true', help="Clear the cache before every request")
+    parser.add_argument('--view', action='append', dest='views', help="Only run this view (may be repeated)")
+    parser.add_argument('--output', default='-', help="JSON report path, '-' for stdout")
+    return parser.parse_args()
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def busiest_user():
+    from django.contrib.auth.models import User
+    from django.db.models import Count
+
+    return User.objects.annotate(n=Count('account__jar__transactions')).order_by('-n').first()
+
+
+def scenarios(user):
+    from django.urls import reverse
+    from core.models import Account, Jar
+
+    account = Account.objects.filter(created_by=user).first()
+    jars = list(Jar.objects.filter(account__created_by=user).order_by('-balance')[:2])
+    source, destination = jars[0], jars[-1]
+
+    def transfer_payload():
+        return {
+            'source_jar': source.pk,
+            'destination_jar': destination.pk,
+            'amount': '0.01',
+            'description': 'benchmark',
+            'created_at': time.strftime('%Y-%m-%dT%H:%M'),
+        }
+
+    return [
+        ('home', 'get', reverse('home'), None),
+        ('account_view', 'get', reverse('account_view'), None),
+        ('owner_view', 'get', reverse('owner_view'), None),
+        ('account_detail_view', 'get', reverse('account_detail', args=[account.pk]), None),
+        ('all_transactions', 'get', reverse('all_transactions'), None),
+        ('all_transactions_filtered', 'get', reverse('all_transactions') + '?type=OUTGOING', None),
+        ('jar_transactions', 'get', reverse('jar_transactions', args=[source.pk]), None),
+        ('transfer_money', 'get', reverse('transfer_money'), None),
+        ('transfer_money_post', 'post', reverse('transfer_money'), transfer_payload),
+    ]
+
+
+def measure(client, method, url, payload, iterations, cold):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    latencies, query_counts, statuses = [], [], set()
+    # One untimed warm-up request so imports and template loading are not measured
+    getattr(client, method)(url, payload() if payload else None)
+    tracemalloc.start()
+    for _ in range(iterations):
+        if cold:
+            cache.clear()
+        data = payload() if payload else None
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            latencies.append((time.perf_counter() - started) * 1000)
+        statuses.add(response.status_code)
+        query_counts.append(len(queries))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'url': url,
+        'method': method.upper(),
+        'status_codes': sorted(statuses),
+        'iterations': iterations,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50), 2),
+            'p90': round(percentile(latencies, 0.90), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'mean': round(statistics.fmean(latencies), 2),
+            'max': round(max(latencies), 2),
+        },
+        'queries': {'min': min(query_counts), 'max': max(query_counts)},
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=_django.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    args = parse_args()
+    database_url = _django.setup()
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import override_settings
+    from core.models import Transaction
+
+    if not args.skip_seed:
+        started = time.perf_counter()
+        call_command('seed_ledger', users=args.users, transactions=args.transactions, seed=args.seed, stdout=io.StringIO())
+        seed_seconds = round(time.perf_counter() - started, 1)
+    else:
+        seed_seconds = None
+
+    user = busiest_user()
+    client = Client()
+    client.force_login(user)
+    results = {}
+    with override_settings(ALLOWED_HOSTS=['*'], STORAGES=STATIC_STORAGES, DEBUG=False):
+        for name, method, url, payload in scenarios(user):
+            if args.views and name not in args.views:
+                continue
+            results[name] = measure(client, method, url, payload, args.iterations, args.cold)
+
+    _django.write_report(args.output, {
+        'benchmark': 'views',
+        'revision': git_revision(),
+        'database': connection.vendor,
+        'database_url': database_url.split('@')[-1],
+        'transactions_total': Transaction.objects.count(),
+        'user_transactions': Transaction.objects.filter(jar__account__created_by=user).count(),
+        'seed_seconds': seed_seconds,
+        'cold_cache': args.cold,
+        'views': results,
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,118 @@
+from datetime import datetime, timedelta
+
 from django.contrib import admin
+from django.contrib.admin.exceptions import NotRegistered
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils import timezone
+from django.utils.functional import cached_property
+from core import search, versions
 from core.models import *
 
 
+class BoundedRelatedFieldListFilter(admin.RelatedFieldListFilter):
+    """
+    Related-object filter that lists at most ``limit`` objects.
+
+    The stock filter loads the whole related table into the sidebar. Here
+    the first ``limit`` objects (in the related admin's ordering) are listed,
+    plus the selected one, so an active filter stays visible however far down
+    the table it is.
+    """
+    limit = 50
+
+    def field_choices(self, field, request, model_admin):
+        try:
+            queryset = model_admin.admin_site.get_model_admin(field.related_model).get_queryset(request)
+        except NotRegistered:
+            queryset = field.related_model._default_manager.all()
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        queryset = queryset.order_by(*ordering or ['pk'])
+        choices = [(obj.pk, str(obj)) for obj in queryset[:self.limit]]
+
+        listed = {str(pk) for pk, _ in choices}
+        selected = [value for value in self.lookup_val or [] if value not in listed]
+        if selected:
+            try:
+                choices += [(obj.pk, str(obj)) for obj in queryset.filter(pk__in=selected)]
+            except (ValueError, ValidationError):
+                pass
+        return choices
+
+
+class DateHierarchyQuerySet(QuerySet):
+    """
+    Queryset whose ``datetimes()`` probes each period with an indexed EXISTS.
+
+    The admin date hierarchy lists the years, months or days that have rows
+    with a DISTINCT over the truncated date of every matching row. Probing
+    the periods between the first and last row instead costs one index
+    lookup per period (at most 31) whatever the number of rows.
+    """
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        if kind not in ('year', 'month', 'day') or tzinfo is not None:
+            return super().datetimes(field_name, kind, order, tzinfo)
+        # Two ordered lookups: SQLite only answers a lone MIN or MAX from the index
+        values = self.order_by().values_list(field_name, flat=True)
+        first, last = values.order_by(field_name).first(), values.order_by(f'-{field_name}').first()
+        if first is None:
+            return []
+
+        first = timezone.localtime(first).replace(tzinfo=None)
+        last = timezone.localtime(last).replace(tzinfo=None)
+        start = datetime(first.year, 1 if kind == 'year' else first.month, first.day if kind == 'day' else 1)
+        periods = []
+        while start <= last:
+            if kind == 'year':
+                end = start.replace(year=start.year + 1)
+            elif kind == 'month':
+                end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+            else:
+                end = start + timedelta(days=1)
+            if self.filter(**{
+                f'{field_name}__gte': timezone.make_aware(start), f'{field_name}__lt': timezone.make_aware(end),
+            }).exists():
+                periods.append(timezone.make_aware(start))
+            start = end
+        return periods if order == 'ASC' else periods[::-1]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that takes the row count of an unfiltered PostgreSQL table from the planner's estimate.
+
+    An exact ``COUNT(*)`` scans the whole table; the estimate is kept up to
+    date by autovacuum and is good enough for numbering changelist pages.
+    Filtered querysets and small tables are still counted exactly.
+    """
+    estimate_above = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] > self.estimate_above:
+                return row[0]
+        return super().count
+
+
 @admin.register(Owner)
 class OwnerAdmin(admin.ModelAdmin):
-    list_display = ['name', 'created_by', 'created_at', 'updated_at']
-    list_filter = ['created_at', 'updated_at', 'created_by']
+    list_display = ['name', 'is_self', 'created_by', 'created_at', 'updated_at']
+    list_filter = ['is_self', 'created_at', 'updated_at', ('created_by', BoundedRelatedFieldListFilter)]
+    list_select_related = ['created_by']
     search_fields = ['name']
-    fields = ['name', 'created_by', 'created_at', 'updated_at']
+    fields = ['name', 'is_self', 'created_by', 'created_at', 'updated_at']
+    autocomplete_fields = ['created_by']
+    show_full_result_count = False
     
     def get_form(self, request, obj=None, **kwargs):
         form = super().get_form(request, obj, **kwargs)
@@ -21,9 +126,16 @@ class OwnerAdmin(admin.ModelAdmin):
 @admin.register(Account)
 class AccountAdmin(admin.ModelAdmin):
     list_display = ['name', 'account_number', 'account_type', 'created_by', 'created_at', 'updated_at']
-    list_filter = ['account_type', 'created_at', 'updated_at', 'created_by']
+    list_filter = ['account_type', 'created_at', 'updated_at', ('created_by', BoundedRelatedFieldListFilter)]
+    list_select_related = ['created_by']
     search_fields = ['name', 'account_number']
     fields = ['name', 'account_number', 'account_type', 'created_by', 'created_at', 'updated_at']
+    autocomplete_fields = ['created_by']
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Account.__str__ shows the username, in autocomplete results and filters too
+        return super().get_queryset(request).select_related('created_by')
     
     def get_form(self, request, obj=None, **kwargs):
         form = super().get_form(request, obj, **kwargs)
@@ -37,9 +149,19 @@ class AccountAdmin(admin.ModelAdmin):
 @admin.register(Jar)
 class JarAdmin(admin.ModelAdmin):
     list_display = ['name', 'account', 'owner', 'balance', 'created_at', 'updated_at']
-    list_filter = ['account', 'owner', 'created_at', 'updated_at']
+    list_filter = [
+        ('account', BoundedRelatedFieldListFilter), ('owner', BoundedRelatedFieldListFilter), 'created_at', 'updated_at',
+    ]
     search_fields = ['name', 'account__name', 'owner__name']
-    fields = ['name', 'account', 'balance', 'owner', 'created_at', 'updated_at']
+    fields = ['name', 'account', 'balance', 'opening_balance', 'owner', 'created_at', 'updated_at']
+    readonly_fields = ['opening_balance']
+    autocomplete_fields = ['account', 'owner']
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    def get_queryset(self, request):
+        # Jar.__str__ and Account.__str__ read these, in autocomplete results too
+        return super().get_queryset(request).select_related('account__created_by', 'owner')
     
     def get_form(self, request, obj=None, **kwargs):
         form = super().get_form(request, obj, **kwargs)
@@ -53,10 +175,34 @@ class JarAdmin(admin.ModelAdmin):
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
     list_display = ['__str__', 'transaction_type', 'amount', 'jar', 'created_at', 'updated_at']
-    list_filter = ['transaction_type', 'created_at', 'updated_at', 'created_by']
-    search_fields = ['source_destination', 'description', 'jar__name']
+    list_filter = ['transaction_type', 'created_at', ('created_by', BoundedRelatedFieldListFilter)]
+    list_select_related = ['jar__owner', 'destination_jar']
+    search_fields = ['source_destination', 'description']
     fields = ['jar', 'transaction_type', 'amount', 'source_destination', 'description', 
               'destination_jar', 'created_by', 'created_at', 'updated_at']
+    autocomplete_fields = ['jar', 'destination_jar', 'created_by']
+    date_hierarchy = 'created_at'
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    paginator = EstimatedCountPaginator
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return DateHierarchyQuerySet(queryset.model, queryset.query, queryset.db)
+
+    def get_search_results(self, request, queryset, search_term):
+        # The full-text index instead of a LIKE '%term%' scan per search field
+        return search.matching(queryset, search_term), False
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        versions.bump(obj.created_by_id)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('created_by_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for user_id in user_ids:
+            versions.bump(user_id)
     
     def get_form(self, request, obj=None, **kwargs):
         form = super().get_form(request, obj, **kwargs)
@@ -66,3 +212,17 @@ class TransactionAdmin(admin.ModelAdmin):
             form.base_fields['created_at'].initial = now
             form.base_fields['updated_at'].initial = now
         return form
+
+
+@admin.register(ApiToken)
+class ApiTokenAdmin(admin.ModelAdmin):
+    list_display = ['name', 'user', 'prefix', 'created_at', 'last_used_at']
+    list_filter = ['created_at', 'last_used_at']
+    list_select_related = ['user']
+    search_fields = ['name', 'prefix', 'user__username']
+    fields = ['name', 'user', 'prefix', 'created_at', 'last_used_at']
+    readonly_fields = ['prefix', 'created_at', 'last_used_at']
+
+    def has_add_permission(self, request):
+        # Keys are only shown when issued, so tokens are created with `manage.py create_api_token`
+        return False
@@ -0,0 +1,208 @@
+"""
+Incrementally maintained daily income/expense buckets.
+
+Each ``DailyAggregate`` row sums the transactions of one jar on one (local)
+day with one counterparty. ``record`` folds freshly posted transactions into
+the buckets so reports can group a few hundred bucket rows by month instead
+of scanning the full transaction history; ``rebuild`` recomputes them from
+scratch with grouped SQL.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from core.models import DailyAggregate, Jar, Transaction
+
+AMOUNT_FIELDS = ('income', 'expenses', 'transfers_in', 'transfers_out')
+
+REPORT_GROUPS = {
+    'jar': ('jar_id', 'jar__name', 'jar__account__name'),
+    'account': ('account_id', 'account__name'),
+    'counterparty': ('source_destination',),
+}
+
+
+def _jar_label(name, account_name):
+    return f"{name} ({account_name})"[:200]
+
+
+def _empty_bucket():
+    return {'income': Decimal(0), 'expenses': Decimal(0), 'transfers_in': Decimal(0),
+            'transfers_out': Decimal(0), 'transaction_count': 0}
+
+
+def bucket_deltas(transactions, jars):
+    """
+    Group transactions into ``{(jar_id, day, counterparty): deltas}``.
+
+    ``jars`` maps jar id to ``(account_id, user_id, name, account_name)``;
+    a transfer counts once on each side, with the other jar as counterparty.
+    """
+    buckets = defaultdict(_empty_bucket)
+    for txn in transactions:
+        day = timezone.localdate(txn.created_at)
+        if txn.transaction_type == 'INCOMING':
+            bucket = buckets[(txn.jar_id, day, txn.source_destination)]
+            bucket['income'] += txn.amount
+        elif txn.transaction_type == 'OUTGOING':
+            bucket = buckets[(txn.jar_id, day, txn.source_destination)]
+            bucket['expenses'] += txn.amount
+        elif txn.transaction_type == 'TRANSFER':
+            bucket = buckets[(txn.jar_id, day, txn.source_destination)]
+            bucket['transfers_out'] += txn.amount
+            source = jars[txn.jar_id]
+            incoming = buckets[(txn.destination_jar_id, day, _jar_label(source[2], source[3]))]
+            incoming['transfers_in'] += txn.amount
+            incoming['transaction_count'] += 1
+        else:
+            continue
+        bucket['transaction_count'] += 1
+    return buckets
+
+
+def _increment(key, deltas):
+    jar_id, day, counterparty = key
+    return DailyAggregate.objects.filter(jar_id=jar_id, day=day, source_destination=counterparty).update(
+        transaction_count=F('transaction_count') + deltas['transaction_count'],
+        **{field: F(field) + deltas[field] for field in AMOUNT_FIELDS},
+    )
+
+
+def _apply(buckets, jars):
+    missing = []
+    for key in sorted(buckets, key=lambda k: (k[0], k[1], k[2])):
+        if not _increment(key, buckets[key]):
+            missing.append(key)
+    if not missing:
+        return
+    rows = [
+        DailyAggregate(
+            user_id=jars[jar_id][1], account_id=jars[jar_id][0], jar_id=jar_id,
+            day=day, source_destination=counterparty, **buckets[(jar_id, day, counterparty)],
+        )
+        for jar_id, day, counterparty in missing
+    ]
+    try:
+        with transaction.atomic():
+            DailyAggregate.objects.bulk_create(rows)
+    except IntegrityError:
+        # A concurrent posting created some of these buckets first; fall back to one row at a time
+        for key, row in zip(missing, rows):
+            if _increment(key, buckets[key]):
+                continue
+            try:
+                with transaction.atomic():
+                    row.save(force_insert=True)
+            except IntegrityError:
+                _increment(key, buckets[key])
+
+
+def record(transactions):
+    """Fold newly posted transactions into their daily buckets"""
+    transactions = list(transactions)
+    if not transactions:
+        return
+    jar_ids = {txn.jar_id for txn in transactions} | {txn.destination_jar_id for txn in transactions if txn.destination_jar_id}
+    jars = {
+        pk: (account_id, user_id, name, account_name)
+        for pk, account_id, user_id, name, account_name in Jar.objects.filter(pk__in=jar_ids).values_list(
+            'pk', 'account_id', 'account__created_by_id', 'name', 'account__name'
+        )
+    }
+    _apply(bucket_deltas(transactions, jars), jars)
+
+
+def rebuild(user_ids=None, batch_size=2000):
+    """Recompute every bucket (optionally only for some users) with grouped SQL; returns rows written"""
+    buckets = DailyAggregate.objects.all()
+    transactions = Transaction.objects.all()
+    transfers = Transaction.objects.filter(transaction_type='TRANSFER', destination_jar__isnull=False)
+    if user_ids is not None:
+        buckets = buckets.filter(user_id__in=user_ids)
+        transactions = transactions.filter(jar__account__created_by_id__in=user_ids)
+        transfers = transfers.filter(destination_jar__account__created_by_id__in=user_ids)
+
+    day = TruncDate('created_at', tzinfo=timezone.get_current_timezone())
+    outgoing_side = (
+        transactions.order_by()
+        .values('jar_id', 'jar__account_id', 'jar__account__created_by_id', 'source_destination', day=day)
+        .annotate(
+            income=Sum('amount', filter=Q(transaction_type='INCOMING'), default=0),
+            expenses=Sum('amount', filter=Q(transaction_type='OUTGOING'), default=0),
+            transfers_out=Sum('amount', filter=Q(transaction_type='TRANSFER'), default=0),
+            transaction_count=Count('pk'),
+        )
+    )
+    incoming_side = (
+        transfers.order_by()
+        .values('destination_jar_id', 'destination_jar__account_id', 'destination_jar__account__created_by_id',
+                'jar__name', 'jar__account__name', day=day)
+        .annotate(transfers_in=Sum('amount'), transaction_count=Count('pk'))
+    )
+
+    written = 0
+    with transaction.atomic():
+        buckets.delete()
+
+        # Transfers are the minority of rows, so their incoming-side buckets are held in
+        # memory and merged into the outgoing-side rows as those stream past
+        incoming = defaultdict(_empty_bucket)
+        owners = {}
+        for row in incoming_side.iterator(chunk_size=batch_size):
+            jar_id = row['destination_jar_id']
+            owners[jar_id] = (row['destination_jar__account_id'], row['destination_jar__account__created_by_id'])
+            key = (jar_id, row['day'], _jar_label(row['jar__name'], row['jar__account__name']))
+            incoming[key]['transfers_in'] += row['transfers_in']
+            incoming[key]['transaction_count'] += row['transaction_count']
+
+        batch = []
+        for row in outgoing_side.iterator(chunk_size=batch_size):
+            key = (row['jar_id'], row['day'], row['source_destination'])
+            extra = incoming.pop(key, None) or _empty_bucket()
+            batch.append(DailyAggregate(
+                user_id=row['jar__account__created_by_id'], account_id=row['jar__account_id'], jar_id=row['jar_id'],
+                day=row['day'], source_destination=row['source_destination'], income=row['income'],
+                expenses=row['expenses'], transfers_in=extra['transfers_in'], transfers_out=row['transfers_out'],
+                transaction_count=row['transaction_count'] + extra['transaction_count'],
+            ))
+            if len(batch) >= batch_size:
+                DailyAggregate.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        batch.extend(
+            DailyAggregate(
+                user_id=owners[jar_id][1], account_id=owners[jar_id][0], jar_id=jar_id,
+                day=day, source_destination=counterparty, **deltas,
+            )
+            for (jar_id, day, counterparty), deltas in incoming.items()
+        )
+        DailyAggregate.objects.bulk_create(batch, batch_size=batch_size)
+        written += len(batch)
+    return written
+
+
+def monthly_report(user, group='jar', months=12):
+    """Month-by-month totals for ``user`` grouped by jar, account or counterparty, read from the buckets"""
+    today = timezone.localdate()
+    year, month = today.year, today.month - (months - 1)
+    while month < 1:
+        year, month = year - 1, month + 12
+    first_month = date(year, month, 1)
+    return (
+        DailyAggregate.objects.filter(user=user, day__gte=first_month)
+        .annotate(month=TruncMonth('day'))
+        .values('month', *REPORT_GROUPS[group])
+        .annotate(
+            income=Sum('income'),
+            expenses=Sum('expenses'),
+            transfers_in=Sum('transfers_in'),
+            transfers_out=Sum('transfers_out'),
+            transaction_count=Sum('transaction_count'),
+        )
+        .order_by('-month', *REPORT_GROUPS[group])
+    )
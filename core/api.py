@@ -0,0 +1,219 @@
+"""
+Token-authenticated JSON API for scripts and bank-feed sync.
+
+Clients send ``Authorization: Bearer <key>`` with a key issued by
+``manage.py create_api_token``. Lists use the same keyset cursors as the
+HTML pages (``after`` / ``before``, see ``core.pagination``). ``POST
+/api/transactions/`` takes up to ``BATCH_LIMIT`` records, validates all of
+them first and posts the batch through ``ledger.create_transactions``: one
+balance update per jar and one bulk insert, committed or rolled back as a
+whole.
+"""
+import json
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from functools import wraps
+
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
+
+from core import ledger, views
+from core.importers import parse_timestamp
+from core.models import ApiToken, Jar, Transaction
+from core.pagination import DEFAULT_PER_PAGE, paginate
+
+BATCH_LIMIT = 1000
+MAX_PAGE_SIZE = 200
+MAX_AMOUNT = Decimal('99999999.99')
+
+# last_used_at is informational; don't write it on every request
+LAST_USED_RESOLUTION = timedelta(minutes=5)
+
+
+def error(message, status=400, **extra):
+    return JsonResponse({'error': message, **extra}, status=status)
+
+
+def token_required(view):
+    """Authenticate the request from its bearer token instead of the session"""
+    @csrf_exempt
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        scheme, _, key = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not key.strip():
+            return error("Missing bearer token", status=401)
+        token = ApiToken.objects.select_related('user').filter(key_hash=ApiToken.digest(key.strip())).first()
+        if token is None or not token.user.is_active:
+            return error("Invalid token", status=401)
+
+        now = timezone.now()
+        if token.last_used_at is None or now - token.last_used_at > LAST_USED_RESOLUTION:
+            ApiToken.objects.filter(pk=token.pk).update(last_used_at=now)
+        request.user = token.user
+        return view(request, *args, **kwargs)
+    return wrapped
+
+
+def jar_json(jar):
+    return {
+        'id': jar.pk,
+        'name': jar.name,
+        'account': jar.account_id,
+        'owner': jar.owner_id,
+        'balance': str(jar.balance),
+        'created_at': jar.created_at,
+        'updated_at': jar.updated_at,
+    }
+
+
+def transaction_json(txn):
+    return {
+        'id': txn.pk,
+        'type': txn.transaction_type,
+        'jar': txn.jar_id,
+        'destination_jar': txn.destination_jar_id,
+        'amount': str(txn.amount),
+        'source_destination': txn.source_destination,
+        'description': txn.description,
+        'created_at': txn.created_at,
+    }
+
+
+def _page(request, queryset, serialize):
+    try:
+        per_page = min(max(int(request.GET.get('limit', DEFAULT_PER_PAGE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        per_page = DEFAULT_PER_PAGE
+    page = paginate(queryset, after=request.GET.get('after'), before=request.GET.get('before'), per_page=per_page)
+    return JsonResponse({
+        'results': [serialize(obj) for obj in page],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
+
+
+@token_required
+@require_GET
+def jar_list(request):
+    return _page(request, Jar.objects.filter(account__created_by=request.user), jar_json)
+
+
+@token_required
+@require_GET
+def jar_detail(request, jar_id):
+    jar = Jar.objects.filter(pk=jar_id, account__created_by=request.user).first()
+    if jar is None:
+        return error("Jar not found", status=404)
+    return JsonResponse(jar_json(jar))
+
+
+@token_required
+@require_http_methods(['GET', 'POST'])
+def transactions(request):
+    """GET: the user's transactions, filtered like the HTML list. POST: create a batch."""
+    if request.method == 'POST':
+        return create_transactions(request)
+    try:
+        queryset, _ = views._filtered_transactions(request)
+    except ValueError:
+        return error("account and jar filters must be ids")
+    return _page(request, queryset, transaction_json)
+
+
+class RecordError(ValueError):
+    pass
+
+
+def _jar(jars, value):
+    try:
+        return jars.get(int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def build_transaction(record, user, jars):
+    """Validate one batch record and return an unsaved ``Transaction``"""
+    if not isinstance(record, dict):
+        raise RecordError("record must be an object")
+
+    transaction_type = str(record.get('type') or '').upper()
+    if transaction_type not in ('INCOMING', 'OUTGOING', 'TRANSFER'):
+        raise RecordError("type must be INCOMING, OUTGOING or TRANSFER")
+
+    try:
+        amount = Decimal(str(record.get('amount')))
+        if not amount.is_finite():
+            raise InvalidOperation
+        amount = amount.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise RecordError(f"invalid amount {record.get('amount')!r}")
+    if not Decimal('0') < amount <= MAX_AMOUNT:
+        raise RecordError(f"amount must be between 0.01 and {MAX_AMOUNT}")
+
+    jar = _jar(jars, record.get('jar'))
+    if jar is None:
+        raise RecordError(f"jar {record.get('jar')!r} does not exist")
+
+    created_at = None
+    if record.get('created_at'):
+        created_at = parse_timestamp(str(record['created_at']))
+        if created_at is None:
+            raise RecordError(f"invalid created_at {record['created_at']!r}")
+
+    txn = Transaction(
+        jar=jar,
+        transaction_type=transaction_type,
+        amount=amount,
+        source_destination=str(record.get('source_destination') or transaction_type.title())[:200],
+        description=record.get('description') or None,
+        created_by=user,
+        created_at=created_at,
+    )
+    if transaction_type == 'TRANSFER':
+        destination = _jar(jars, record.get('destination_jar'))
+        if destination is None:
+            raise RecordError(f"destination_jar {record.get('destination_jar')!r} does not exist")
+        if destination == jar:
+            raise RecordError("cannot transfer to the same jar")
+        txn.destination_jar = destination
+        txn.source_destination = f"{destination.name} ({destination.account.name})"
+    return txn
+
+
+def create_transactions(request):
+    """
+    Post a batch of records atomically.
+
+    The body is ``{"transactions": [...]}`` (or a bare list). Balances are
+    checked per jar against the net effect of the whole batch, so an
+    income and an expense for the same jar in one batch offset each other.
+    Returns 201 with the created rows, 400 listing every invalid record,
+    or 409 naming the jar that would be overdrawn.
+    """
+    try:
+        body = json.loads(request.body or b'null')
+    except ValueError:
+        return error("Request body must be JSON")
+    records = body.get('transactions') if isinstance(body, dict) else body
+    if not isinstance(records, list) or not records:
+        return error("Send a non-empty list of transactions")
+    if len(records) > BATCH_LIMIT:
+        return error(f"At most {BATCH_LIMIT} transactions per request")
+
+    jars = {jar.pk: jar for jar in Jar.objects.filter(account__created_by=request.user).select_related('account')}
+    batch, errors = [], []
+    for index, record in enumerate(records):
+        try:
+            batch.append(build_transaction(record, request.user, jars))
+        except RecordError as e:
+            errors.append({'index': index, 'error': str(e)})
+    if errors:
+        return error("Invalid transactions", errors=errors)
+
+    try:
+        created = ledger.create_transactions(batch)
+    except ledger.InsufficientBalance as e:
+        return error(str(e), status=409, jar=e.jar_id)
+    return JsonResponse({'transactions': [transaction_json(txn) for txn in created]}, status=201)
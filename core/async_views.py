@@ -0,0 +1,141 @@
+"""
+Async versions of the read-heavy views.
+
+Routed instead of their ``core.views`` counterparts when ``ASYNC_VIEWS`` is
+on and the site is served through ``www.asgi`` (see DEPLOYMENT.md). Each view
+starts its independent queries at the same time, every one in a worker
+thread with its own database connection, so a page costs roughly its slowest
+query instead of the sum of all of them, and a slow page holds neither a
+worker process nor the event loop. Templates are rendered through
+``sync_to_async`` because they may still follow lazy relations.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.db import close_old_connections
+from django.http import Http404, HttpResponseBadRequest
+from django.shortcuts import aget_object_or_404, render
+from django.utils.functional import SimpleLazyObject
+
+from core import checkpoints, dashboard, rollups, versions, views
+from core.forms import JarFormNoAccount
+from core.models import Account, Jar, Transaction
+from core.pagination import paginate
+
+
+def _with_connection(func):
+    def run():
+        # Executor threads outlive the request: apply CONN_MAX_AGE / health checks on
+        # the way in and out, like Django does around every sync request
+        close_old_connections()
+        try:
+            return func()
+        finally:
+            close_old_connections()
+    return run
+
+
+async def gather(*funcs):
+    """Run blocking ORM callables concurrently, each in its own thread and database connection"""
+    return await asyncio.gather(
+        *(sync_to_async(_with_connection(func), thread_sensitive=False)() for func in funcs)
+    )
+
+
+async def _user(request):
+    # Pin the resolved user so templates and helpers reading request.user don't query again
+    request.user = await request.auser()
+    return request.user
+
+
+async def _render(request, template_name, context):
+    return await sync_to_async(render)(request, template_name, context)
+
+
+@login_required
+async def home(request):
+    user = await _user(request)
+    ledger_version = await sync_to_async(versions.current)(user.pk)
+    # Both are lazy, like in the sync view: they only query when their
+    # version-keyed {% cache %} fragment misses while the template renders
+    recent_transactions = (
+        Transaction.objects.filter(jar__account__created_by=user)
+        .select_related('jar', 'jar__account', 'jar__owner', 'destination_jar', 'destination_jar__account')
+        .order_by('-created_at')[:5]
+    )
+    return await _render(request, 'core/index.html', {
+        'recent_transactions': recent_transactions,
+        'summary': SimpleLazyObject(lambda: dashboard.get_summary(user)),
+        'ledger_version': ledger_version,
+        'fragment_timeout': views.FRAGMENT_CACHE_TIMEOUT,
+    })
+
+
+@login_required
+async def account_detail_view(request, account_id):
+    if request.method != 'GET':
+        # Jar create/update/delete stay on the sync view
+        return await sync_to_async(views.account_detail_view)(request, account_id=account_id)
+
+    user = await _user(request)
+    accounts, jars = await gather(
+        lambda: rollups.for_accounts(Account.objects.filter(id=account_id, created_by=user)),
+        lambda: list(Jar.objects.filter(account_id=account_id, account__created_by=user).select_related('owner')),
+    )
+    if not accounts:
+        raise Http404
+    return await _render(request, 'core/account_detail.html', {
+        'account': accounts[0],
+        'jars': jars,
+        'form': JarFormNoAccount(user=user),
+    })
+
+
+@login_required
+async def all_transactions(request):
+    user = await _user(request)
+    try:
+        transactions, filters = views._filtered_transactions(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    page, totals, user_accounts, user_jars = await gather(
+        lambda: paginate(
+            transactions.select_related('jar', 'jar__account', 'jar__owner', 'destination_jar', 'destination_jar__account'),
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        ),
+        lambda: dashboard.get_ledger_totals(user, transactions, ['all_transactions', filters]),
+        lambda: list(Account.objects.filter(created_by=user)),
+        lambda: list(Jar.objects.filter(account__created_by=user).select_related('account')),
+    )
+    return await _render(request, 'core/all_transactions.html', {
+        'transactions': page.object_list,
+        'page': page,
+        'user_accounts': user_accounts,
+        'user_jars': user_jars,
+        **totals,
+        **filters,
+    })
+
+
+@login_required
+async def jar_transactions(request, jar_id):
+    user = await _user(request)
+    jar = await aget_object_or_404(Jar.objects.select_related('owner'), id=jar_id, account__created_by=user)
+    transactions = checkpoints.jar_transactions(jar.pk)
+    page, totals = await gather(
+        lambda: paginate(
+            transactions,
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+            annotate=checkpoints.running_balance(jar.pk),
+        ),
+        lambda: dashboard.get_ledger_totals(user, transactions, ['jar_transactions', jar.pk]),
+    )
+    return await _render(request, 'core/jar_transactions.html', {
+        'jar': jar,
+        'transactions': page.object_list,
+        'page': page,
+        **totals,
+    })
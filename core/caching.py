@@ -0,0 +1,72 @@
+"""
+Cache helpers for expensive, per-user computations.
+
+``get_or_compute`` adds single-flight behaviour on top of the shared cache:
+when a key is missing, only the worker that wins a short ``cache.add`` lock
+runs the computation while the others poll for its result. Expiry times are
+jittered so entries written together (for example after a deploy) do not all
+expire and get recomputed in the same instant.
+
+The lock is only exclusive where ``cache.add`` is atomic: Redis and
+locmem. On the file and database caches ``add`` is a check followed by a
+write, so two workers can occasionally both compute the same value.
+Single-flight is best-effort there; results stay correct, only the
+duplicated work is not always avoided.
+"""
+import random
+import time
+import uuid
+
+from django.core.cache import cache
+
+LOCK_TIMEOUT = 30
+WAIT_TIMEOUT = 5.0
+POLL_INTERVAL = 0.05
+
+_MISSING = object()
+
+
+def jittered(timeout, spread=0.1):
+    """``timeout`` scattered by up to ``spread`` in either direction"""
+    if not timeout:
+        return timeout
+    return max(1, round(timeout * random.uniform(1 - spread, 1 + spread)))
+
+
+def get_or_compute(key, compute, timeout, lock_timeout=LOCK_TIMEOUT, wait=WAIT_TIMEOUT):
+    """
+    Return the cached value for ``key``, calling ``compute()`` on a miss.
+
+    Concurrent misses are collapsed: one caller computes and stores the value
+    while the rest wait up to ``wait`` seconds for it to appear. If the lock
+    holder fails or takes too long, waiters compute the value themselves
+    rather than erroring.
+    """
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = f"{key}:lock"
+    token = uuid.uuid4().hex
+    if cache.add(lock_key, token, lock_timeout):
+        try:
+            value = compute()
+            cache.set(key, value, jittered(timeout))
+            return value
+        finally:
+            # Don't release a lock that expired and was taken by another worker
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if cache.get(lock_key) is None:
+            break
+
+    value = compute()
+    cache.set(key, value, jittered(timeout))
+    return value
@@ -0,0 +1,22 @@
+"""
+Per-user jar catalogue.
+
+The transfer form's choices, its validation and the balance sidebar all need
+the user's jars with their account and owner. The list is fetched once and
+cached under the user's ledger version, so it is reused until a write to
+that ledger bumps the version.
+"""
+from core import caching, versions
+from core.models import Jar
+
+CATALOGUE_TIMEOUT = 60 * 60
+
+
+def jars(user):
+    """The user's jars (account and owner loaded), cached per ledger version"""
+    key = versions.cache_key('jar-catalogue', user.pk)
+    return caching.get_or_compute(
+        key,
+        lambda: list(Jar.objects.filter(account__created_by=user).select_related('account', 'owner').order_by('pk')),
+        CATALOGUE_TIMEOUT,
+    )
@@ -0,0 +1,218 @@
+"""
+Per-jar balance checkpoints.
+
+A ``JarCheckpoint`` holds a jar's balance at the start of a (local) day. One
+is written for every jar and day that receives a transaction, as the
+transaction posts, so the balance at any moment is the nearest earlier
+checkpoint plus the transactions of at most one day. A backdated
+transaction shifts the jar's later checkpoints with a single ``F()`` update
+instead of replaying history; ``rebuild`` recomputes them from scratch with
+grouped SQL.
+
+Balances here come from ``Jar.opening_balance`` plus transaction history.
+Changes made to ``Jar.balance`` without a transaction row (``add_money``,
+edits in the admin or jar forms) are not part of that history; they show up
+as drift in ``manage.py reconcile_jars``.
+"""
+from collections import defaultdict
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When, Window
+from django.db.models.functions import Round, TruncDate
+from django.db.models.expressions import RowRange
+from django.utils import timezone
+
+from core.models import Jar, JarCheckpoint, Transaction
+
+BALANCE_FIELD = DecimalField(max_digits=14, decimal_places=2)
+CENT = Decimal('0.01')
+
+
+def day_start(value):
+    """Local midnight at or before ``value``"""
+    return timezone.make_aware(datetime.combine(timezone.localtime(value).date(), time.min))
+
+
+def jar_transactions(jar_id):
+    """Every transaction that moves money in or out of the jar, incoming transfers included"""
+    return Transaction.objects.filter(Q(jar_id=jar_id) | Q(destination_jar_id=jar_id))
+
+
+def signed_amount(jar_id):
+    """A transaction's effect on the jar's balance, for rows of ``jar_transactions(jar_id)``"""
+    return Case(
+        When(Q(transaction_type='INCOMING') | Q(destination_jar_id=jar_id), then=F('amount')),
+        default=-F('amount'),
+        output_field=BALANCE_FIELD,
+    )
+
+
+def _net(jar_id, rows):
+    # SQLite sums decimals as floats, so round back to cents
+    total = rows.order_by().aggregate(total=Sum(signed_amount(jar_id)))['total'] or Decimal('0')
+    return total.quantize(CENT)
+
+
+def balance_before(jar_id, created_at=None, pk=None, inclusive=False):
+    """
+    The jar's balance just before the transaction position ``(created_at, pk)``.
+
+    With ``inclusive`` the transaction at that position counts too; without
+    ``pk`` every transaction at ``created_at`` is on the same side. With no
+    ``created_at`` all transactions are included. Reads one checkpoint and
+    the transactions after it, which all fall on one day.
+    """
+    rows = jar_transactions(jar_id)
+    if created_at is None:
+        position = Q()
+    elif pk is None:
+        position = Q(**{'created_at__lte' if inclusive else 'created_at__lt': created_at})
+    else:
+        position = Q(created_at__lt=created_at) | Q(created_at=created_at, **{'pk__lte' if inclusive else 'pk__lt': pk})
+
+    checkpoints = JarCheckpoint.objects.filter(jar_id=jar_id)
+    if created_at is not None:
+        checkpoints = checkpoints.filter(at__lte=created_at)
+    checkpoint = checkpoints.order_by('-at').values_list('at', 'balance').first()
+    if checkpoint is not None:
+        at, balance = checkpoint
+        return balance + _net(jar_id, rows.filter(position, created_at__gte=at))
+
+    first = JarCheckpoint.objects.filter(jar_id=jar_id).order_by('at').values_list('at', 'balance').first()
+    if first is not None:
+        # Walk back from the first checkpoint; once rebuilt, no transaction precedes it
+        at, balance = first
+        return balance - _net(jar_id, rows.filter(created_at__lt=at).exclude(position))
+    # Never checkpointed: no transactions yet, or history from before checkpoints were rebuilt
+    opening = Jar.objects.filter(pk=jar_id).values_list('opening_balance', flat=True).get()
+    return opening + _net(jar_id, rows.filter(position))
+
+
+def balance_at(jar, when):
+    """The jar's balance after every transaction created at or before ``when``"""
+    return balance_before(getattr(jar, 'pk', jar), when, inclusive=True)
+
+
+def _day_deltas(transactions):
+    deltas = defaultdict(Decimal)
+    for txn in transactions:
+        at = day_start(txn.created_at)
+        if txn.transaction_type == 'INCOMING':
+            deltas[txn.jar_id, at] += txn.amount
+        else:
+            deltas[txn.jar_id, at] -= txn.amount
+            if txn.transaction_type == 'TRANSFER':
+                deltas[txn.destination_jar_id, at] += txn.amount
+    return deltas
+
+
+def record(transactions):
+    """
+    Keep checkpoints in step with freshly posted, not yet inserted ``transactions``.
+
+    Called by ``ledger.post_transactions`` after the jar balances were
+    updated, so the jar rows are locked. Writes the missing checkpoint of
+    every (jar, day) in the batch from the state before the batch, then
+    moves each later checkpoint by the batch's net effect on that jar's
+    earlier days.
+    """
+    deltas = _day_deltas(transactions)
+    if not deltas:
+        return
+
+    existing = set(
+        JarCheckpoint.objects.filter(
+            jar_id__in={jar_id for jar_id, _ in deltas}, at__in={at for _, at in deltas},
+        ).values_list('jar_id', 'at')
+    )
+    # Earlier days first, so a later new checkpoint can start from an earlier one
+    for jar_id, at in sorted(key for key in deltas if key not in existing):
+        JarCheckpoint.objects.create(jar_id=jar_id, at=at, balance=balance_before(jar_id, at))
+
+    for (jar_id, at), delta in deltas.items():
+        if delta:
+            JarCheckpoint.objects.filter(jar_id=jar_id, at__gt=at).update(balance=F('balance') + delta)
+
+
+def running_balance(jar_id):
+    """
+    ``paginate`` annotation adding each row's ``running_balance``: the jar's balance after it.
+
+    The sum is a window over the page query itself, anchored at the cursor:
+    walking down from the cursor the balance before the cursor row minus
+    everything newer on the page, walking up the balance after the cursor
+    row plus everything older on the page.
+    """
+    signed = signed_amount(jar_id)
+
+    def annotate(edge, descending):
+        created_at, pk = edge or (None, None)
+        if descending:
+            anchor = balance_before(jar_id, created_at, pk)
+            order_by = [F('created_at').desc(), F('pk').desc()]
+            # Balance after a row = anchor - (newer rows on the page, itself included) + itself
+            expression = Value(anchor, output_field=BALANCE_FIELD) - Window(
+                Sum(signed), order_by=order_by, frame=RowRange(start=None, end=0),
+            ) + signed
+        else:
+            anchor = balance_before(jar_id, created_at, pk, inclusive=True)
+            order_by = [F('created_at').asc(), F('pk').asc()]
+            expression = Value(anchor, output_field=BALANCE_FIELD) + Window(
+                Sum(signed), order_by=order_by, frame=RowRange(start=None, end=0),
+            )
+        return {'running_balance': Round(expression, 2, output_field=BALANCE_FIELD)}
+
+    return annotate
+
+
+def rebuild(jar_ids=None, batch_size=500):
+    """
+    Recompute checkpoints from the transaction table.
+
+    Each jar's history starts from its ``opening_balance``. Only ``jar_ids``
+    are rebuilt when given. Returns the number of checkpoints written.
+    """
+    jars = Jar.objects.order_by('pk')
+    if jar_ids is not None:
+        jars = jars.filter(pk__in=jar_ids)
+
+    written = 0
+    ids = list(jars.values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        with transaction.atomic():
+            written += _rebuild_jars(chunk)
+    return written
+
+
+def _rebuild_jars(jar_ids):
+    days = defaultdict(lambda: defaultdict(Decimal))
+    outgoing = (
+        Transaction.objects.filter(jar_id__in=jar_ids).order_by()
+        .values('jar_id', day=TruncDate('created_at'))
+        .annotate(total=Sum(Case(
+            When(transaction_type='INCOMING', then=F('amount')), default=-F('amount'), output_field=BALANCE_FIELD,
+        )))
+    )
+    for row in outgoing:
+        days[row['jar_id']][row['day']] += row['total'].quantize(CENT)
+    incoming = (
+        Transaction.objects.filter(destination_jar_id__in=jar_ids, transaction_type='TRANSFER').order_by()
+        .values('destination_jar_id', day=TruncDate('created_at'))
+        .annotate(total=Sum('amount'))
+    )
+    for row in incoming:
+        days[row['destination_jar_id']][row['day']] += row['total'].quantize(CENT)
+
+    checkpoints = []
+    for jar_id, running in Jar.objects.filter(pk__in=jar_ids).values_list('pk', 'opening_balance'):
+        for day in sorted(days[jar_id]):
+            checkpoints.append(JarCheckpoint(
+                jar_id=jar_id, at=timezone.make_aware(datetime.combine(day, time.min)), balance=running,
+            ))
+            running += days[jar_id][day]
+    JarCheckpoint.objects.filter(jar_id__in=jar_ids).delete()
+    JarCheckpoint.objects.bulk_create(checkpoints, batch_size=1000)
+    return len(checkpoints)
@@ -0,0 +1,73 @@
+"""
+Dashboard summary statistics.
+
+Income, expenses, transaction count and the rollup totals are fetched in a
+single aggregate query and cached under the user's ledger version, so any
+write to the ledger retires the cached copy. Totals of filtered transaction
+lists are cached the same way, so paging through a list aggregates it once.
+"""
+import hashlib
+import json
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Max, Q, Sum
+
+from core import caching, rollups, versions
+
+SUMMARY_TIMEOUT = 60 * 60
+
+_TRANSACTIONS = 'account__jar__transactions'
+
+
+def build_summary(user):
+    """Compute the dashboard figures for ``user`` in one database round-trip"""
+    summary = User.objects.filter(pk=user.pk).aggregate(
+        total_income=Sum(f'{_TRANSACTIONS}__amount', filter=Q(**{f'{_TRANSACTIONS}__transaction_type': 'INCOMING'})),
+        total_expenses=Sum(f'{_TRANSACTIONS}__amount', filter=Q(**{f'{_TRANSACTIONS}__transaction_type': 'OUTGOING'})),
+        total_transactions=Count(_TRANSACTIONS),
+        # The rollup is one-to-one with the user, so Max() just carries it through the aggregate
+        total_balance=Max('ledger_rollup__balance'),
+        total_jars=Max('ledger_rollup__jar_count'),
+        account_count=Max('ledger_rollup__account_count'),
+    )
+    if summary['total_balance'] is None:
+        rollup = rollups.for_user(user)
+        summary.update(
+            total_balance=rollup.balance,
+            total_jars=rollup.jar_count,
+            account_count=rollup.account_count,
+        )
+    summary['total_income'] = summary['total_income'] or 0
+    summary['total_expenses'] = summary['total_expenses'] or 0
+    return summary
+
+
+def get_summary(user):
+    """Return the cached dashboard summary for ``user``, computing it on a miss"""
+    key = versions.cache_key('dashboard-summary', user.pk)
+    return caching.get_or_compute(key, lambda: build_summary(user), SUMMARY_TIMEOUT)
+
+
+def ledger_totals(transactions):
+    """Income, expenses, net and count for a filtered transaction queryset"""
+    totals = transactions.order_by().aggregate(
+        total_income=Sum('amount', filter=Q(transaction_type='INCOMING')),
+        total_expenses=Sum('amount', filter=Q(transaction_type='OUTGOING')),
+        total_transactions=Count('pk'),
+    )
+    totals['total_income'] = totals['total_income'] or 0
+    totals['total_expenses'] = totals['total_expenses'] or 0
+    totals['net_amount'] = totals['total_income'] - totals['total_expenses']
+    return totals
+
+
+def get_ledger_totals(user, transactions, scope):
+    """
+    Return ``ledger_totals(transactions)`` cached under the user's ledger version.
+
+    ``scope`` is any JSON-serialisable value that identifies the queryset,
+    such as the view name and its filters.
+    """
+    digest = hashlib.sha1(json.dumps(scope, sort_keys=True).encode()).hexdigest()
+    key = versions.cache_key(f'ledger-totals:{digest}', user.pk)
+    return caching.get_or_compute(key, lambda: ledger_totals(transactions), SUMMARY_TIMEOUT)
@@ -0,0 +1,19 @@
+"""
+Query expressions shared by the views.
+"""
+from django.db.models import IntegerField, Subquery
+
+
+class CappedCount(Subquery):
+    """
+    Correlated ``COUNT(*)`` that stops after ``limit`` rows.
+
+    The inner queryset is sliced to ``limit`` primary keys and wrapped in a
+    derived table, so the database reads at most ``limit`` index entries per
+    outer row instead of counting the full history. Use it where the UI only
+    distinguishes "N" from "more than N".
+    """
+    template = '(SELECT COUNT(*) FROM (%(subquery)s) AS capped)'
+
+    def __init__(self, queryset, limit, **extra):
+        super().__init__(queryset.order_by().values('pk')[:limit], output_field=IntegerField(), **extra)
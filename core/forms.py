@@ -1,4 +1,7 @@
+from decimal import Decimal
+
 from core.models import *
+from core import catalogue, ledger
 from django import forms
 
 
@@ -31,6 +34,12 @@ class JarFormNoAccount(forms.ModelForm):
         owner = forms.ModelChoiceField(queryset=Owner.objects.all())
         balance = forms.DecimalField(max_digits=10, decimal_places=2, initial=0.00)
 
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only offer the requesting user's owners
+        if user is not None:
+            self.fields['owner'].queryset = Owner.objects.filter(created_by=user)
+
 
 class TransactionForm(forms.ModelForm):
     created_at = forms.DateTimeField(
@@ -143,14 +152,41 @@ class OutgoingTransactionForm(forms.ModelForm):
         return transaction
 
 
+class JarChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField that can be backed by an already loaded list of jars,
+    so rendering the choices and validating the submitted value need no query.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.jars = None
+
+    def set_jars(self, jars, label):
+        self.jars = {str(jar.pk): jar for jar in jars}
+        self.choices = [('', '---------')] + [(jar.pk, label(jar)) for jar in jars]
+
+    def to_python(self, value):
+        if self.jars is None:
+            return super().to_python(value)
+        if value in self.empty_values:
+            return None
+        try:
+            return self.jars[str(value)]
+        except KeyError:
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value},
+            )
+
+
 class TransferForm(forms.ModelForm):
-    source_jar = forms.ModelChoiceField(
+    source_jar = JarChoiceField(
         queryset=Jar.objects.all(),
         widget=forms.Select(attrs={'class': 'form-select'}),
         help_text="Select the jar to transfer money FROM",
         empty_label="-- Select source jar --"
     )
-    destination_jar = forms.ModelChoiceField(
+    destination_jar = JarChoiceField(
         queryset=Jar.objects.all(),
         widget=forms.Select(attrs={'class': 'form-select'}),
         help_text="Select the jar to transfer money TO",
@@ -169,7 +205,8 @@ class TransferForm(forms.ModelForm):
 
     class Meta:
         model = Transaction
-        fields = ['source_jar', 'destination_jar', 'amount', 'description', 'created_at']
+        # destination_jar is set in save() so model validation doesn't look the jar up again
+        fields = ['source_jar', 'amount', 'description', 'created_at']
         widgets = {
             'description': forms.Textarea(attrs={
                 'rows': 3,
@@ -193,20 +230,16 @@ class TransferForm(forms.ModelForm):
             from django.utils import timezone
             self.fields['created_at'].initial = timezone.now().strftime('%Y-%m-%dT%H:%M')
         
-        # Filter jars by user and customize display
+        # Choices and validation both read the user's cached jar catalogue
+        self.jars = []
         if self.user:
-            user_jars = Jar.objects.filter(account__created_by=self.user).select_related('account', 'owner')
-            self.fields['source_jar'].queryset = user_jars
-            self.fields['destination_jar'].queryset = user_jars
-            
-            # Customize the choice labels to show account and balance info
-            jar_choices = []
-            for jar in user_jars:
-                label = f"{jar.name} - {jar.account.name} (Balance: {jar.balance}) - {jar.owner.name}"
-                jar_choices.append((jar.id, label))
-            
-            self.fields['source_jar'].choices = [('', '---------')] + jar_choices
-            self.fields['destination_jar'].choices = [('', '---------')] + jar_choices
+            self.jars = catalogue.jars(self.user)
+            self.fields['source_jar'].set_jars(self.jars, self.jar_label)
+            self.fields['destination_jar'].set_jars(self.jars, self.jar_label)
+
+    @staticmethod
+    def jar_label(jar):
+        return f"{jar.name} - {jar.account.name} (Balance: {jar.balance}) - {jar.owner.name}"
 
     def clean(self):
         cleaned_data = super().clean()
@@ -237,3 +270,135 @@ class TransferForm(forms.ModelForm):
         if commit:
             transaction.save()
         return transaction
+
+
+class TransferLegForm(forms.Form):
+    """One destination of a batch transfer"""
+    destination_jar = JarChoiceField(
+        queryset=Jar.objects.all(),
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        empty_label="-- Select destination jar --"
+    )
+    amount = forms.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        min_value=Decimal('0.01'),
+        widget=forms.NumberInput(attrs={
+            'step': '0.01',
+            'min': '0.01',
+            'class': 'form-control',
+            'placeholder': '0.00'
+        }),
+    )
+
+    def __init__(self, *args, jars=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['destination_jar'].set_jars(jars, TransferForm.jar_label)
+
+
+class BaseTransferLegFormSet(forms.BaseFormSet):
+    def clean(self):
+        if any(self.errors):
+            return
+        destinations = [leg['destination_jar'] for leg in self.legs()]
+        if len(destinations) != len(set(destinations)):
+            raise forms.ValidationError("Each destination jar can only be used once per transfer.")
+
+    def legs(self):
+        """Cleaned data of the filled-in legs; blank extra rows are ignored"""
+        return [form.cleaned_data for form in self.forms if form.cleaned_data]
+
+
+TransferLegFormSet = forms.formset_factory(
+    TransferLegForm,
+    formset=BaseTransferLegFormSet,
+    extra=3,
+    min_num=1,
+    validate_min=True,
+    max_num=50,
+    validate_max=True,
+)
+
+
+class BatchTransferForm(forms.Form):
+    """
+    Split one source jar across several destination jars.
+
+    The destination legs live in ``self.legs`` (a ``TransferLegFormSet``).
+    The batch is checked against the source balance once, and ``save``
+    posts every leg in one database transaction, writing each jar's
+    balance a single time.
+    """
+    source_jar = JarChoiceField(
+        queryset=Jar.objects.all(),
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        help_text="Select the jar to transfer money FROM",
+        empty_label="-- Select source jar --"
+    )
+    created_at = forms.DateTimeField(
+        widget=forms.DateTimeInput(attrs={
+            'type': 'datetime-local',
+            'class': 'form-control'
+        }),
+        help_text="Select the date and time for this transfer",
+        label="Transfer Date"
+    )
+    description = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={
+            'rows': 3,
+            'class': 'form-control',
+            'placeholder': 'Optional: Add notes about this transfer...'
+        }),
+    )
+
+    def __init__(self, data=None, *args, user=None, **kwargs):
+        super().__init__(data, *args, **kwargs)
+        if not self.initial.get('created_at'):
+            from django.utils import timezone
+            self.fields['created_at'].initial = timezone.now().strftime('%Y-%m-%dT%H:%M')
+
+        self.jars = catalogue.jars(user) if user else []
+        self.fields['source_jar'].set_jars(self.jars, TransferForm.jar_label)
+        self.legs = TransferLegFormSet(data, prefix='legs', form_kwargs={'jars': self.jars})
+
+    def is_valid(self):
+        form_valid = super().is_valid()
+        legs_valid = self.legs.is_valid()
+        if not (form_valid and legs_valid):
+            return False
+
+        source_jar = self.cleaned_data['source_jar']
+        legs = self.legs.legs()
+        if any(leg['destination_jar'] == source_jar for leg in legs):
+            self.add_error('source_jar', "Cannot transfer money to the same jar.")
+        elif self.total > source_jar.balance:
+            self.add_error(None, (
+                f"Insufficient balance in {source_jar.name}. "
+                f"Available: {source_jar.balance}, Requested: {self.total}"
+            ))
+        return not self.errors
+
+    @property
+    def total(self):
+        return sum((leg['amount'] for leg in self.legs.legs()), Decimal('0'))
+
+    def save(self, user):
+        """Create one TRANSFER per leg; raises ``ValueError`` if the source ran short meanwhile"""
+        source_jar = self.cleaned_data['source_jar']
+        transfers = [
+            Transaction(
+                jar=source_jar,
+                destination_jar=leg['destination_jar'],
+                transaction_type='TRANSFER',
+                amount=leg['amount'],
+                source_destination=f"{leg['destination_jar'].name} ({leg['destination_jar'].account.name})",
+                description=self.cleaned_data['description'],
+                created_at=self.cleaned_data['created_at'],
+                created_by=user,
+            )
+            for leg in self.legs.legs()
+        ]
+        return ledger.create_transactions(
+            transfers, messages={source_jar.pk: "Insufficient balance in source jar"}
+        )
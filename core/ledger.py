@@ -0,0 +1,124 @@
+"""
+Atomic balance posting.
+
+Every write that moves money goes through ``post_transactions`` (or the lower
+level ``post``): balances are changed with conditional ``F()`` updates that
+only touch the balance columns, jars are updated in primary-key order so
+concurrent transfers always take row locks in the same sequence, and the
+whole posting either commits or rolls back together with the caller's
+transaction rows.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core import aggregates, checkpoints, rollups, versions
+from core.models import Jar, Transaction
+
+
+class InsufficientBalance(ValueError):
+    """Raised when a posting would take a jar below zero"""
+
+    def __init__(self, jar_id, message="Insufficient balance in jar"):
+        super().__init__(message)
+        self.jar_id = jar_id
+
+
+def transaction_deltas(transactions):
+    """Net balance change per jar id for an iterable of unsaved transactions"""
+    deltas = defaultdict(Decimal)
+    for txn in transactions:
+        if txn.transaction_type == 'INCOMING':
+            deltas[txn.jar_id] += txn.amount
+        elif txn.transaction_type == 'OUTGOING':
+            deltas[txn.jar_id] -= txn.amount
+        elif txn.transaction_type == 'TRANSFER':
+            deltas[txn.jar_id] -= txn.amount
+            deltas[txn.destination_jar_id] += txn.amount
+    return dict(deltas)
+
+
+def post(deltas, messages=None):
+    """
+    Apply ``{jar_id: delta}`` to jar balances and rollups atomically.
+
+    Debits are conditional on the jar still holding enough money, so a
+    concurrent posting can never overdraw it; ``InsufficientBalance`` is
+    raised (rolling the whole posting back) when one fails. ``messages`` can
+    map a jar id to the error text to use for it. Returns the new balance of
+    every jar touched.
+    """
+    messages = messages or {}
+    deltas = {jar_id: delta for jar_id, delta in deltas.items() if delta}
+    if not deltas:
+        return {}
+
+    now = timezone.now()
+    with transaction.atomic():
+        for jar_id in sorted(deltas):
+            delta = deltas[jar_id]
+            jars = Jar.objects.filter(pk=jar_id)
+            if delta < 0:
+                jars = jars.filter(balance__gte=-delta)
+            if not jars.update(balance=F('balance') + delta, updated_at=now):
+                if delta < 0 and Jar.objects.filter(pk=jar_id).exists():
+                    raise InsufficientBalance(jar_id, messages.get(jar_id, "Insufficient balance in jar"))
+                raise Jar.DoesNotExist(f"Jar {jar_id} does not exist")
+
+        balances = {}
+        account_deltas = defaultdict(Decimal)
+        user_deltas = defaultdict(Decimal)
+        rows = Jar.objects.filter(pk__in=deltas).values_list('pk', 'account_id', 'account__created_by_id', 'balance')
+        for jar_id, account_id, user_id, balance in rows:
+            balances[jar_id] = balance
+            account_deltas[account_id] += deltas[jar_id]
+            user_deltas[user_id] += deltas[jar_id]
+        rollups.adjust_balances(account_deltas, user_deltas)
+    for user_id in user_deltas:
+        versions.bump(user_id)
+    return balances
+
+
+def post_transactions(transactions, messages=None):
+    """
+    Post the balance effect of unsaved ``transactions`` in one atomic step.
+
+    In-memory jar instances attached to the transactions are refreshed with
+    their new balances. Callers save the transaction rows inside the same
+    ``transaction.atomic()`` block so rows and balances commit together.
+    """
+    transactions = list(transactions)
+    balances = post(transaction_deltas(transactions), messages=messages)
+    aggregates.record(transactions)
+    checkpoints.record(transactions)
+    for txn in transactions:
+        for field in ('jar', 'destination_jar'):
+            if txn._meta.get_field(field).is_cached(txn):
+                jar = getattr(txn, field)
+                if jar is not None and jar.pk in balances:
+                    jar.balance = balances[jar.pk]
+                    jar._rollup_state = (jar.account_id, jar.balance)
+    return balances
+
+
+def create_transactions(transactions, messages=None, batch_size=500):
+    """
+    Insert many unsaved transactions with one aggregated balance posting.
+
+    Rows are written with ``bulk_create`` and each jar's balance is updated
+    once for the whole batch, all inside a single database transaction.
+    """
+    transactions = list(transactions)
+    if not transactions:
+        return []
+    now = timezone.now()
+    for txn in transactions:
+        txn.created_at = txn.created_at or now
+        txn.updated_at = now
+    with transaction.atomic():
+        post_transactions(transactions, messages=messages)
+        created = Transaction.objects.bulk_create(transactions, batch_size=batch_size)
+    return created
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core import aggregates
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily income/expense buckets from the transaction table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help="Only rebuild buckets for this user id (may be given multiple times)",
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        written = aggregates.rebuild(user_ids=options['user_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} daily bucket(s)"))
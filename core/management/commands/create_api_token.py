@@ -0,0 +1,21 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import ApiToken
+
+
+class Command(BaseCommand):
+    help = "Issue a bearer token for the JSON API; the key is printed once and only its hash is stored"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="User the token acts as")
+        parser.add_argument('--name', default='API client', help="What the token is used for")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']!r} does not exist")
+        token, key = ApiToken.issue(user, options['name'])
+        self.stderr.write(f"Created token {token.prefix}… for {user.username}. Store it now, it cannot be shown again:")
+        self.stdout.write(key)
@@ -0,0 +1,72 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from core import views
+from core.models import Account, Jar
+
+# Rendering only needs plain static URLs, not the collected manifest
+STATIC_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Run each view for a user, capture the SQL it issues and print the "
+        "database's EXPLAIN plan for every query against the core tables"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help="Username to run the views as")
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help="Execute the queries and show actual timings (PostgreSQL EXPLAIN ANALYZE)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']!r} does not exist")
+
+        account = Account.objects.filter(created_by=user).first()
+        jar = Jar.objects.filter(account__created_by=user).first()
+        targets = [
+            ('home', views.home, reverse('home'), {}),
+            ('owner_view', views.owner_view, reverse('owner_view'), {}),
+            ('account_view', views.account_view, reverse('account_view'), {}),
+            ('all_transactions', views.all_transactions, reverse('all_transactions'), {}),
+            ('all_transactions?type=OUTGOING', views.all_transactions, reverse('all_transactions') + '?type=OUTGOING', {}),
+            ('transfer_money', views.transfer_money, reverse('transfer_money'), {}),
+        ]
+        if account:
+            targets.append(('account_detail_view', views.account_detail_view,
+                            reverse('account_detail', args=[account.pk]), {'account_id': account.pk}))
+        if jar:
+            targets.append(('jar_transactions', views.jar_transactions,
+                            reverse('jar_transactions', args=[jar.pk]), {'jar_id': jar.pk}))
+
+        explain_options = {'analyze': True} if options['analyze'] and connection.vendor == 'postgresql' else {}
+        prefix = connection.ops.explain_query_prefix(**explain_options)
+        factory = RequestFactory()
+
+        for name, view, url, kwargs in targets:
+            request = factory.get(url)
+            request.user = user
+            with override_settings(STORAGES=STATIC_STORAGES), CaptureQueriesContext(connection) as captured:
+                view(request, **kwargs)
+
+            queries = [q['sql'] for q in captured.captured_queries if 'core_' in q['sql']]
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== {name} ({len(queries)} queries) =="))
+            for sql in dict.fromkeys(queries):
+                self.stdout.write(self.style.SQL_KEYWORD(sql))
+                with connection.cursor() as cursor:
+                    cursor.execute(f"{prefix} {sql}")
+                    for row in cursor.fetchall():
+                        self.stdout.write("    " + " | ".join(str(col) for col in row))
+                self.stdout.write("")
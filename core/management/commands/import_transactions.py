@@ -0,0 +1,59 @@
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core import importers, ledger
+from core.models import Jar
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or OFX statement into a user's jars, posting balances per chunk"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or OFX file to import")
+        parser.add_argument('--user', required=True, help="Username the transactions belong to")
+        parser.add_argument('--jar', type=int, help="Jar id for rows that do not name one (required for OFX)")
+        parser.add_argument('--format', choices=['csv', 'ofx'], help="File format, detected from the extension by default")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--dry-run', action='store_true', help="Validate and count rows without writing anything")
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f"{path} does not exist")
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']!r} does not exist")
+        if options['jar'] and not Jar.objects.filter(pk=options['jar'], account__created_by=user).exists():
+            raise CommandError(f"Jar {options['jar']} does not belong to {user}")
+
+        file_format = options['format'] or ('ofx' if path.suffix.lower() in ('.ofx', '.qfx') else 'csv')
+        if file_format == 'ofx' and not options['jar']:
+            raise CommandError("--jar is required for OFX imports")
+        reader = importers.read_ofx if file_format == 'ofx' else importers.read_csv
+
+        def progress(stats):
+            self.stdout.write(f"  imported {stats['imported']}, skipped {stats['duplicates']} duplicate(s)")
+
+        with path.open(newline='', encoding=options['encoding']) as stream:
+            try:
+                stats = importers.import_rows(
+                    reader(stream),
+                    user,
+                    default_jar_id=options['jar'],
+                    chunk_size=options['chunk_size'],
+                    dry_run=options['dry_run'],
+                    on_chunk=progress if options['verbosity'] > 1 else None,
+                )
+            except ledger.InsufficientBalance as e:
+                raise CommandError(f"Jar {e.jar_id} would be overdrawn by the current chunk; earlier chunks were kept")
+            except importers.ImportRowError as e:
+                raise CommandError(f"{e}; earlier chunks were kept")
+
+        verb = "Would import" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {stats['imported']} transaction(s), skipped {stats['duplicates']} duplicate(s)"
+        ))
@@ -0,0 +1,82 @@
+import csv
+import json
+import time
+from itertools import groupby, islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import provisioning
+
+
+def read_csv(stream):
+    """
+    One row per account; consecutive rows with the same username are one user.
+
+    Columns: username, email, first_name, last_name, password, account_name,
+    account_number, account_type. Rows without account_name add no account.
+    """
+    rows = csv.DictReader(stream)
+    for username, group in groupby(rows, key=lambda row: (row.get('username') or '').strip()):
+        group = list(group)
+        first = group[0]
+        yield {
+            'username': username,
+            'email': (first.get('email') or '').strip(),
+            'first_name': (first.get('first_name') or '').strip(),
+            'last_name': (first.get('last_name') or '').strip(),
+            'password': first.get('password') or None,
+            'accounts': [
+                {
+                    'name': row['account_name'].strip(),
+                    'account_number': (row.get('account_number') or '').strip(),
+                    'account_type': (row.get('account_type') or 'CASH').strip().upper(),
+                }
+                for row in group if (row.get('account_name') or '').strip()
+            ],
+        }
+
+
+def read_jsonl(stream):
+    """One user spec per line, as taken by ``provisioning.provision_users``"""
+    for number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise CommandError(f"Line {number} is not valid JSON")
+
+
+class Command(BaseCommand):
+    help = "Create many users with their Self owner, accounts and Main jars using bulk inserts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV (one row per account) or JSON Lines (one user per line) file")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="File format, detected from the extension by default")
+        parser.add_argument('--password', help="Password for users without their own; unusable password otherwise")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Users created per transaction")
+        parser.add_argument('--encoding', default='utf-8-sig')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f"{path} does not exist")
+        file_format = options['format'] or ('jsonl' if path.suffix.lower() in ('.jsonl', '.ndjson') else 'csv')
+        reader = read_jsonl if file_format == 'jsonl' else read_csv
+
+        started = time.perf_counter()
+        created = 0
+        with path.open(newline='', encoding=options['encoding']) as stream:
+            specs = reader(stream)
+            while batch := list(islice(specs, options['batch_size'])):
+                try:
+                    users = provisioning.provision_users(batch, password=options['password'])
+                except provisioning.ProvisioningError as e:
+                    raise CommandError(f"{e}; {created} user(s) from earlier batches were kept")
+                created += len(users)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"  created {created} user(s)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created} user(s) in {time.perf_counter() - started:.1f}s"
+        ))
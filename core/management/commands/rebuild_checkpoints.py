@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core import checkpoints
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-jar daily balance checkpoints from the transaction table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--jar', type=int, action='append', dest='jar_ids',
+            help="Only rebuild checkpoints for this jar id (may be given multiple times)",
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help="Jars rebuilt per database transaction")
+
+    def handle(self, *args, **options):
+        written = checkpoints.rebuild(jar_ids=options['jar_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} checkpoint(s)"))
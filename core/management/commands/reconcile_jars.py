@@ -0,0 +1,71 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import reconcile
+
+
+def _init_worker():
+    # Spawned workers start without Django; forked ones must not reuse the parent's connections
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _scan(bounds):
+    return reconcile.scan(*bounds)
+
+
+class Command(BaseCommand):
+    help = "Recompute every jar balance from its transactions, report drift and optionally repair it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Processes scanning jar-id ranges in parallel (1 scans in this process)")
+        parser.add_argument('--chunk-size', type=int, default=10_000, help="Jar ids per range")
+        parser.add_argument('--repair', action='store_true', help="Set drifted balances to the recomputed value")
+        parser.add_argument('--batch-size', type=int, default=500, help="Jars repaired per UPDATE")
+        parser.add_argument('--show', type=int, default=20, help="How many of the largest drifts to list")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        ranges = reconcile.id_ranges(options['chunk_size'])
+        checked, drifts = 0, []
+
+        if options['workers'] <= 1 or len(ranges) <= 1:
+            for bounds in ranges:
+                count, found = _scan(bounds)
+                checked += count
+                drifts.extend(found)
+        else:
+            # Children must open their own connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+                for future in as_completed([pool.submit(_scan, bounds) for bounds in ranges]):
+                    count, found = future.result()
+                    checked += count
+                    drifts.extend(found)
+
+        drifts.sort(key=lambda drift: abs(drift.amount), reverse=True)
+        total = sum((abs(drift.amount) for drift in drifts), Decimal('0'))
+        self.stdout.write(
+            f"Checked {checked} jar(s) in {len(ranges)} range(s) in {time.perf_counter() - started:.1f}s: "
+            f"{len(drifts)} drifted, {total} total absolute drift"
+        )
+        for drift in drifts[:options['show']]:
+            self.stdout.write(
+                f"  jar {drift.jar_id} (user {drift.user_id}): balance {drift.balance}, "
+                f"expected {drift.expected}, drift {drift.amount:+}"
+            )
+
+        if not drifts:
+            self.stdout.write(self.style.SUCCESS("No drift"))
+        elif options['repair']:
+            repaired = reconcile.repair(drifts, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} jar(s)"))
+        else:
+            self.stdout.write(self.style.WARNING("Run again with --repair to fix the drifted balances"))
@@ -0,0 +1,134 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core import aggregates, checkpoints, rollups
+from core.models import Account, Jar, Owner, Transaction
+
+JAR_NAMES = ['Main', 'Groceries', 'Rent', 'Savings', 'Travel', 'Health', 'Fun', 'Education', 'Gifts', 'Emergency']
+OWNER_NAMES = ['Self', 'Partner', 'Kid', 'Household']
+INCOME_SOURCES = ['Salary', 'Freelance', 'Bonus', 'Interest', 'Refund', 'Gift']
+EXPENSE_TARGETS = ['Grocery Store', 'Landlord', 'Electric Co', 'Pharmacy', 'Airline', 'Restaurant', 'Bookshop',
+                   'Internet', 'Gym', 'Cinema', 'Fuel Station', 'Bakery']
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic ledger (users, owners, accounts, jars, transactions) with bulk inserts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--accounts-per-user', type=int, default=3)
+        parser.add_argument('--jars-per-account', type=int, default=4)
+        parser.add_argument('--transactions', type=int, default=10_000, help="Total transactions across all users")
+        parser.add_argument('--days', type=int, default=730, help="Spread transactions over this many past days")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--password', default='seed-password', help="Password set on every generated user")
+        parser.add_argument('--prefix', default=None, help="Username prefix (defaults to a per-run value)")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        prefix = options['prefix'] or f"seed{int(time.time())}"
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            users, jars_by_user = self.create_structure(rng, prefix, options)
+            balances = self.create_transactions(rng, users, jars_by_user, options)
+            jars = Jar.objects.in_bulk(list(balances))
+            for jar_id, balance in balances.items():
+                jars[jar_id].balance = balance
+            Jar.objects.bulk_update(jars.values(), ['balance'], batch_size=options['batch_size'])
+
+        user_ids = [user.pk for user in users]
+        rollups.rebuild(user_ids=user_ids)
+        aggregates.rebuild(user_ids=user_ids)
+        checkpoints.rebuild(jar_ids=list(balances))
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(users)} user(s) with prefix {prefix!r} and {options['transactions']} transaction(s) "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def create_structure(self, rng, prefix, options):
+        now = timezone.now()
+        password = make_password(options['password'])
+        users = User.objects.bulk_create([
+            User(username=f"{prefix}-{index}", password=password, date_joined=now)
+            for index in range(options['users'])
+        ])
+        owners = Owner.objects.bulk_create([
+            Owner(name=name, created_by=user, is_self=index == 0, created_at=now, updated_at=now)
+            for user in users for index, name in enumerate(OWNER_NAMES)
+        ])
+        owners_by_user = {}
+        for owner in owners:
+            owners_by_user.setdefault(owner.created_by_id, []).append(owner)
+
+        accounts = Account.objects.bulk_create([
+            Account(
+                name=f"Account {index + 1}", account_number=f"{rng.randint(10**9, 10**10 - 1)}",
+                account_type=rng.choice(Account.ACCOUNT_TYPE_CHOICES)[0], created_by=user,
+                created_at=now, updated_at=now,
+            )
+            for user in users for index in range(options['accounts_per_user'])
+        ])
+        jars = Jar.objects.bulk_create([
+            Jar(
+                name=JAR_NAMES[index % len(JAR_NAMES)], account=account, balance=0,
+                owner=owners_by_user[account.created_by_id][0 if index == 0 else rng.randrange(len(OWNER_NAMES))],
+                created_at=now, updated_at=now,
+            )
+            for account in accounts for index in range(options['jars_per_account'])
+        ], batch_size=options['batch_size'])
+        jars_by_user = {}
+        account_users = {account.pk: account.created_by_id for account in accounts}
+        for jar in jars:
+            jars_by_user.setdefault(account_users[jar.account_id], []).append(jar.pk)
+        return users, jars_by_user
+
+    def create_transactions(self, rng, users, jars_by_user, options):
+        now = timezone.now()
+        span = options['days'] * 86400
+        balances = {jar_id: Decimal(0) for jar_ids in jars_by_user.values() for jar_id in jar_ids}
+        batch = []
+        for index in range(options['transactions']):
+            user = users[index % len(users)]
+            jar_ids = jars_by_user[user.pk]
+            jar_id = rng.choice(jar_ids)
+            amount = Decimal(rng.randint(100, 50_000)) / 100
+            roll = rng.random()
+            txn = Transaction(
+                jar_id=jar_id, amount=amount, created_by=user,
+                created_at=now - timedelta(seconds=rng.randrange(span)), updated_at=now,
+            )
+            # Keep every jar solvent: only spend or move money the jar actually has
+            if roll < 0.55 and balances[jar_id] >= amount:
+                txn.transaction_type = 'OUTGOING'
+                txn.source_destination = rng.choice(EXPENSE_TARGETS)
+                balances[jar_id] -= amount
+            elif roll < 0.7 and len(jar_ids) > 1 and balances[jar_id] >= amount:
+                destination = rng.choice([other for other in jar_ids if other != jar_id])
+                txn.transaction_type = 'TRANSFER'
+                txn.destination_jar_id = destination
+                txn.source_destination = f"Jar {destination}"
+                balances[jar_id] -= amount
+                balances[destination] += amount
+            else:
+                txn.transaction_type = 'INCOMING'
+                txn.source_destination = rng.choice(INCOME_SOURCES)
+                balances[jar_id] += amount
+            batch.append(txn)
+            if len(batch) >= options['batch_size']:
+                Transaction.objects.bulk_create(batch)
+                batch = []
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"  {index + 1} transactions")
+        if batch:
+            Transaction.objects.bulk_create(batch)
+        return balances
@@ -0,0 +1,252 @@
+"""
+Per-request performance metrics.
+
+``RequestMetricsMiddleware`` (see ``core.middleware``) fills a
+``RequestMetrics`` for every request: database query count and time,
+template render time and total latency, plus the SQL shapes that were
+executed repeatedly and are therefore probable N+1 patterns. Finished
+requests are logged as one JSON line and folded into a process-local
+registry that ``metrics_view`` exposes in the Prometheus text format.
+
+A scrape reaches a single gunicorn worker, so every worker publishes a
+snapshot of its registry to the shared cache every few seconds and the
+scrape renders all of them, each series labelled with the worker it came
+from.
+"""
+import contextvars
+import hmac
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger('core.metrics')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+PUBLISH_INTERVAL = 5
+# Snapshots of workers that stopped (restarts, scale-downs) drop out after a day
+SNAPSHOT_TIMEOUT = 24 * 60 * 60
+WORKERS_KEY = 'core:metrics:workers'
+
+_current = contextvars.ContextVar('core_request_metrics', default=None)
+
+_IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+
+
+def sql_shape(sql):
+    """Collapse ``IN (%s, %s, ...)`` lists so queries differing only in list length share a shape"""
+    return _IN_LIST.sub('(%s, ...)', sql)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.shapes = Counter()
+        self._template_depth = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.shapes[sql_shape(sql)] += 1
+
+    def repeated_shapes(self, threshold):
+        return {shape: count for shape, count in self.shapes.items() if count >= threshold}
+
+
+def current():
+    return _current.get()
+
+
+def activate(request_metrics):
+    return _current.set(request_metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+_instrumented = False
+
+
+def instrument_templates():
+    """Wrap ``Template.render`` once so top-level render time lands on the active request"""
+    global _instrumented
+    if _instrumented:
+        return
+    from django.template.base import Template
+
+    original_render = Template.render
+
+    def render(self, context):
+        request_metrics = _current.get()
+        if request_metrics is None:
+            return original_render(self, context)
+        request_metrics._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return original_render(self, context)
+        finally:
+            request_metrics._template_depth -= 1
+            # Included/extended templates render inside their parent; only count the outermost one
+            if not request_metrics._template_depth:
+                request_metrics.template_time += time.perf_counter() - started
+
+    Template.render = render
+    _instrumented = True
+
+
+class Registry:
+    """Thread-safe aggregation of this process's finished requests per view"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.reset()
+
+    def reset(self):
+        self.requests = Counter()
+        self.queries = Counter()
+        self.db_seconds = defaultdict(float)
+        self.template_seconds = defaultdict(float)
+        self.duration_seconds = defaultdict(float)
+        self.duration_buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+        self.n_plus_one = Counter()
+        self._published = 0.0
+
+    def observe(self, view, status, request_metrics, duration, n_plus_one):
+        with self._lock:
+            self.requests[(view, status)] += 1
+            self.queries[view] += request_metrics.queries
+            self.db_seconds[view] += request_metrics.db_time
+            self.template_seconds[view] += request_metrics.template_time
+            self.duration_seconds[view] += duration
+            buckets = self.duration_buckets[view]
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    buckets[index] += 1
+            if n_plus_one:
+                self.n_plus_one[view] += 1
+            due = time.monotonic() - self._published >= PUBLISH_INTERVAL
+        if due:
+            self.publish()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': dict(self.requests),
+                'queries': dict(self.queries),
+                'db_seconds': dict(self.db_seconds),
+                'template_seconds': dict(self.template_seconds),
+                'duration_seconds': dict(self.duration_seconds),
+                'duration_buckets': {view: list(buckets) for view, buckets in self.duration_buckets.items()},
+                'n_plus_one': dict(self.n_plus_one),
+            }
+
+    def publish(self):
+        """Store this worker's snapshot in the shared cache and make sure the worker is listed"""
+        self._published = time.monotonic()
+        cache.set(f'core:metrics:worker:{self.worker}', self.snapshot(), timeout=SNAPSHOT_TIMEOUT)
+        # Not atomic on the file and database caches: a worker dropped by a racing
+        # update lists itself again on its next publish
+        workers = cache.get(WORKERS_KEY) or set()
+        if self.worker not in workers:
+            cache.set(WORKERS_KEY, workers | {self.worker}, timeout=SNAPSHOT_TIMEOUT)
+
+    def collect(self):
+        """Snapshots of every worker that published recently, with this one's taken live"""
+        workers = cache.get(WORKERS_KEY) or set()
+        keys = {f'core:metrics:worker:{worker}': worker for worker in workers}
+        snapshots = {keys[key]: snapshot for key, snapshot in cache.get_many(list(keys)).items()}
+        snapshots[self.worker] = self.snapshot()
+        return snapshots
+
+
+def render(snapshots):
+    """Prometheus text for ``{worker: snapshot}``; every series carries a ``worker`` label"""
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def series(field):
+        for worker, snapshot in sorted(snapshots.items()):
+            for key, value in sorted(snapshot[field].items()):
+                yield worker, key, value
+
+    family('balance_jar_requests_total', 'counter', "Requests handled, by view and status code.")
+    for worker, (view, status), count in series('requests'):
+        lines.append(f'balance_jar_requests_total{{worker="{worker}",view="{view}",status="{status}"}} {count}')
+
+    family('balance_jar_db_queries_total', 'counter', "Database queries issued, by view.")
+    for worker, view, count in series('queries'):
+        lines.append(f'balance_jar_db_queries_total{{worker="{worker}",view="{view}"}} {count}')
+
+    family('balance_jar_db_seconds_total', 'counter', "Time spent in database queries, by view.")
+    for worker, view, seconds in series('db_seconds'):
+        lines.append(f'balance_jar_db_seconds_total{{worker="{worker}",view="{view}"}} {seconds:.6f}')
+
+    family('balance_jar_template_seconds_total', 'counter', "Time spent rendering templates, by view.")
+    for worker, view, seconds in series('template_seconds'):
+        lines.append(f'balance_jar_template_seconds_total{{worker="{worker}",view="{view}"}} {seconds:.6f}')
+
+    family('balance_jar_n_plus_one_requests_total', 'counter', "Requests with repeated identical SQL shapes.")
+    for worker, view, count in series('n_plus_one'):
+        lines.append(f'balance_jar_n_plus_one_requests_total{{worker="{worker}",view="{view}"}} {count}')
+
+    family('balance_jar_request_duration_seconds', 'histogram', "Total request latency, by view.")
+    for worker, view, buckets in series('duration_buckets'):
+        labels = f'worker="{worker}",view="{view}"'
+        for bound, count in zip(DURATION_BUCKETS, buckets):
+            lines.append(f'balance_jar_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        snapshot = snapshots[worker]
+        total = sum(count for (name, _), count in snapshot['requests'].items() if name == view)
+        lines.append(f'balance_jar_request_duration_seconds_bucket{{{labels},le="+Inf"}} {total}')
+        lines.append(f'balance_jar_request_duration_seconds_sum{{{labels}}} {snapshot["duration_seconds"][view]:.6f}')
+        lines.append(f'balance_jar_request_duration_seconds_count{{{labels}}} {total}')
+    return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def log_request(request, view, status, request_metrics, duration, repeated):
+    logger.info(json.dumps({
+        'event': 'request_metrics',
+        'method': request.method,
+        'path': request.path,
+        'view': view,
+        'status': status,
+        'duration_ms': round(duration * 1000, 2),
+        'db_queries': request_metrics.queries,
+        'db_ms': round(request_metrics.db_time * 1000, 2),
+        'template_ms': round(request_metrics.template_time * 1000, 2),
+        'n_plus_one': [{'sql': shape, 'count': count} for shape, count in repeated.items()],
+    }))
+
+
+def metrics_view(request):
+    """Prometheus-style scrape endpoint, served only with ``Authorization: Bearer <REQUEST_METRICS_TOKEN>``"""
+    token = settings.REQUEST_METRICS_TOKEN
+    if not settings.REQUEST_METRICS or not token:
+        raise Http404
+    # Behind the reverse proxy every client address is the proxy's, so access is by token only
+    scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(supplied.strip().encode(), token.encode()):
+        raise Http404
+    return HttpResponse(render(registry.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,49 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from core import metrics
+
+
+class RequestMetricsMiddleware:
+    """
+    Record query count, DB time, template time and latency for every request.
+
+    Opt-in through the REQUEST_METRICS setting; when it is off Django drops
+    the middleware at start-up and requests pay nothing for it.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = settings.REQUEST_METRICS_N_PLUS_ONE_THRESHOLD
+        metrics.instrument_templates()
+
+    def __call__(self, request):
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.activate(request_metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(request_metrics.record_query))
+                response = self.get_response(request)
+        finally:
+            metrics.deactivate(token)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        repeated = request_metrics.repeated_shapes(self.threshold)
+        metrics.registry.observe(view, response.status_code, request_metrics, duration, bool(repeated))
+        metrics.log_request(request, view, response.status_code, request_metrics, duration, repeated)
+        response['Server-Timing'] = (
+            f"db;dur={request_metrics.db_time * 1000:.1f}, "
+            f"tpl;dur={request_metrics.template_time * 1000:.1f}, "
+            f"total;dur={duration * 1000:.1f}"
+        )
+        return response
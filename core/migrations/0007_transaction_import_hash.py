@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_account_rollup_user_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='import_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Content hash of the imported row, used to skip duplicates on re-import', max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_transaction_import_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='jar',
+            index=models.Index(fields=['account', 'owner'], name='core_jar_account_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['jar', '-created_at'], name='core_txn_jar_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['jar', 'transaction_type'], name='core_txn_jar_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['destination_jar', '-created_at'], name='core_txn_dest_created_idx'),
+        ),
+    ]
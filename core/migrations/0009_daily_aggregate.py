@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('source_destination', models.CharField(max_length=200)),
+                ('income', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('expenses', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transfers_in', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transfers_out', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.account')),
+                ('jar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.jar')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'day'], name='core_daily_user_day_idx'), models.Index(fields=['account', 'day'], name='core_daily_account_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('jar', 'day', 'source_destination'), name='core_daily_aggregate_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_api_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JarCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('at', models.DateTimeField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('jar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='core.jar')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('jar', 'at'), name='core_jar_checkpoint_at')],
+            },
+        ),
+    ]
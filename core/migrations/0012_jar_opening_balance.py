@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:03
+
+from django.db import migrations, models
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+
+def backfill_opening_balance(apps, schema_editor):
+    # Existing balances are taken as correct: opening = balance - net of the jar's transactions
+    Jar = apps.get_model('core', 'Jar')
+    Transaction = apps.get_model('core', 'Transaction')
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+
+    own = (
+        Transaction.objects.filter(jar=OuterRef('pk')).order_by().values('jar')
+        .annotate(total=Sum(Case(
+            When(transaction_type='INCOMING', then=F('amount')), default=-F('amount'), output_field=amount,
+        )))
+        .values('total')
+    )
+    incoming = (
+        Transaction.objects.filter(destination_jar=OuterRef('pk'), transaction_type='TRANSFER').order_by()
+        .values('destination_jar').annotate(total=Sum('amount')).values('total')
+    )
+    Jar.objects.update(opening_balance=(
+        F('balance')
+        - Coalesce(Subquery(own), Value(0), output_field=amount)
+        - Coalesce(Subquery(incoming), Value(0), output_field=amount)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_jar_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jar',
+            name='opening_balance',
+            field=models.DecimalField(decimal_places=2, default=0, help_text="Balance before the jar's first transaction; balance should equal this plus its transactions", max_digits=10),
+        ),
+        migrations.RunPython(backfill_opening_balance, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:06
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def mark_self_owners(apps, schema_editor):
+    # Until now the Self owner was found by name; keep the oldest one per user
+    Owner = apps.get_model('core', 'Owner')
+    first_self = Owner.objects.filter(name='Self').order_by().values('created_by').annotate(first=Min('pk')).values('first')
+    Owner.objects.filter(pk__in=first_self).update(is_self=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_jar_opening_balance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='owner',
+            name='is_self',
+            field=models.BooleanField(default=False, help_text="The owner created for the user themselves; new accounts' Main jars belong to it"),
+        ),
+        migrations.RunPython(mark_self_owners, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='owner',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_self', True)), fields=('created_by',), name='core_owner_one_self_per_user'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from core import search
+    search.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from core import search
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    """Full-text search index outside the model: a tsvector column on PostgreSQL, an FTS5 table on SQLite"""
+
+    dependencies = [
+        ('core', '0014_transaction_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -30,6 +30,17 @@ class BaseModel(models.Model):
 class Owner(BaseModel):
     name = models.CharField(max_length=100)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    is_self = models.BooleanField(
+        default=False,
+        help_text="The owner created for the user themselves; new accounts' Main jars belong to it"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['created_by'], condition=models.Q(is_self=True), name='core_owner_one_self_per_user',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -61,23 +72,50 @@ class Jar(BaseModel):
     name = models.CharField(max_length=100)
     account = models.ForeignKey(Account, on_delete=models.CASCADE)
     balance = models.DecimalField(max_digits=10, decimal_places=2)
+    opening_balance = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        help_text="Balance before the jar's first transaction; balance should equal this plus its transactions"
+    )
     owner = models.ForeignKey(Owner, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['account', 'owner'], name='core_jar_account_owner_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.owner.name}"
 
+    def save(self, *args, **kwargs):
+        # A new jar starts from the balance it was created with
+        if self._state.adding and not self.opening_balance:
+            self.opening_balance = self.balance or 0
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted account/balance so rollups can apply deltas on save
+        instance._rollup_state = (instance.__dict__.get('account_id'), instance.__dict__.get('balance'))
+        return instance
+
     def add_money(self, amount):
         """Add money to the jar balance"""
-        self.balance += amount
-        self.save()
+        from core import ledger
+        self.balance = ledger.post({self.pk: amount})[self.pk]
+        self._rollup_state = (self.account_id, self.balance)
 
     def remove_money(self, amount):
         """Remove money from the jar balance"""
-        if self.balance >= amount:
-            self.balance -= amount
-            self.save()
-            return True
-        return False
+        from core import ledger
+        try:
+            self.balance = ledger.post({self.pk: -amount})[self.pk]
+        except ledger.InsufficientBalance:
+            return False
+        self._rollup_state = (self.account_id, self.balance)
+        return True
 
 
 class Transaction(BaseModel):
@@ -103,9 +141,26 @@ class Transaction(BaseModel):
         blank=True,
         help_text="Destination jar for transfers"
     )
+    import_hash = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Content hash of the imported row, used to skip duplicates on re-import"
+    )
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['jar', '-created_at', '-id'], name='core_txn_jar_created_idx'),
+            models.Index(fields=['jar', 'transaction_type'], name='core_txn_jar_type_idx'),
+            models.Index(fields=['destination_jar', '-created_at'], name='core_txn_dest_created_idx'),
+            # Admin date hierarchy and newest-first changelists across all jars
+            models.Index(fields=['-created_at', '-id'], name='core_txn_created_idx'),
+            # Keyset pages of a user's transactions across all their jars
+            models.Index(fields=['created_by', '-created_at', '-id'], name='core_txn_user_created_idx'),
+        ]
 
     def __str__(self):
         if self.transaction_type == 'TRANSFER':
@@ -114,29 +169,119 @@ class Transaction(BaseModel):
 
     def save(self, *args, **kwargs):
         """Override save to update jar balance automatically"""
-        is_new = self.pk is None
-        
-        if is_new:
-            # Update jar balance based on transaction type
-            if self.transaction_type == 'INCOMING':
-                self.jar.add_money(self.amount)
-            elif self.transaction_type == 'OUTGOING':
-                if not self.jar.remove_money(self.amount):
-                    raise ValueError("Insufficient balance in jar")
-            elif self.transaction_type == 'TRANSFER':
-                if not self.destination_jar:
-                    raise ValueError("Destination jar is required for transfers")
-                if self.jar == self.destination_jar:
-                    raise ValueError("Cannot transfer to the same jar")
-                
-                # Remove money from source jar
-                if not self.jar.remove_money(self.amount):
-                    raise ValueError("Insufficient balance in source jar")
-                
-                # Add money to destination jar
-                self.destination_jar.add_money(self.amount)
-                
-                # Update source_destination for display
-                self.source_destination = f"{self.destination_jar.name} ({self.destination_jar.account.name})"
-        
-        super().save(*args, **kwargs)
\ No newline at end of file
+        from django.db import transaction
+        from core import ledger
+
+        if self.pk is not None:
+            return super().save(*args, **kwargs)
+
+        messages = {}
+        if self.transaction_type == 'OUTGOING':
+            messages[self.jar_id] = "Insufficient balance in jar"
+        elif self.transaction_type == 'TRANSFER':
+            if not self.destination_jar:
+                raise ValueError("Destination jar is required for transfers")
+            if self.jar == self.destination_jar:
+                raise ValueError("Cannot transfer to the same jar")
+            messages[self.jar_id] = "Insufficient balance in source jar"
+
+            # Update source_destination for display
+            self.source_destination = f"{self.destination_jar.name} ({self.destination_jar.account.name})"
+
+        # Posting buckets the transaction by day, so stamp it before BaseModel.save would
+        if not self.created_at:
+            from django.utils import timezone
+            self.created_at = timezone.now()
+
+        # Balances and the transaction row commit or roll back together
+        with transaction.atomic():
+            ledger.post_transactions([self], messages=messages)
+            super().save(*args, **kwargs)
+
+
+class AccountRollup(models.Model):
+    """Denormalized balance and jar count for a single account"""
+    account = models.OneToOneField(Account, on_delete=models.CASCADE, primary_key=True, related_name='rollup')
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    jar_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Rollup for {self.account_id}"
+
+
+class UserRollup(models.Model):
+    """Denormalized balance, jar and account counts for a single user"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='ledger_rollup')
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    jar_count = models.IntegerField(default=0)
+    account_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Rollup for {self.user_id}"
+
+
+class DailyAggregate(models.Model):
+    """Income/expense totals for one jar, day and counterparty, maintained as transactions post"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE)
+    jar = models.ForeignKey(Jar, on_delete=models.CASCADE)
+    day = models.DateField()
+    source_destination = models.CharField(max_length=200)
+    income = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expenses = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transfers_in = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transfers_out = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['jar', 'day', 'source_destination'], name='core_daily_aggregate_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'day'], name='core_daily_user_day_idx'),
+            models.Index(fields=['account', 'day'], name='core_daily_account_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.jar_id} {self.day} {self.source_destination}"
+
+
+class JarCheckpoint(models.Model):
+    """A jar's balance at the start of a (local) day: its opening balance plus every earlier transaction"""
+    jar = models.ForeignKey(Jar, on_delete=models.CASCADE, related_name='checkpoints')
+    at = models.DateTimeField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['jar', 'at'], name='core_jar_checkpoint_at'),
+        ]
+
+    def __str__(self):
+        return f"{self.jar_id} @ {self.at}: {self.balance}"
+
+
+class ApiToken(models.Model):
+    """Bearer token for the JSON API; only a SHA-256 digest of the secret is stored"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='api_tokens')
+    name = models.CharField(max_length=100, help_text="What the token is used for, e.g. 'bank feed sync'")
+    prefix = models.CharField(max_length=8, editable=False, help_text="First characters of the token, to tell tokens apart")
+    key_hash = models.CharField(max_length=64, unique=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.prefix}…) <{self.user.username}>"
+
+    @staticmethod
+    def digest(key):
+        import hashlib
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @classmethod
+    def issue(cls, user, name):
+        """Create a token for ``user``; returns ``(token, key)`` and ``key`` is never shown again"""
+        import secrets
+        key = secrets.token_urlsafe(32)
+        token = cls.objects.create(user=user, name=name, prefix=key[:8], key_hash=cls.digest(key))
+        return token, key
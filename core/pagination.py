@@ -0,0 +1,99 @@
+"""
+Keyset (cursor) pagination for transaction lists.
+
+Pages are addressed by the ``(created_at, id)`` of the row at their edge
+instead of an OFFSET, so fetching page 1000 costs the same single indexed
+range scan as fetching page 1.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+DEFAULT_PER_PAGE = 50
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def encode_cursor(obj):
+    raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """Return ``(created_at, pk)`` for a cursor string, or None if it is malformed"""
+    if not value:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def paginate(queryset, after=None, before=None, per_page=DEFAULT_PER_PAGE, annotate=None):
+    """
+    Return one ``KeysetPage`` of ``queryset`` in ``-created_at, -id`` order.
+
+    ``after`` and ``before`` are cursors taken from a previous page's
+    ``next_cursor`` / ``previous_cursor``; with neither the first page is
+    returned. ``created_at`` is always populated by ``BaseModel.save``.
+
+    ``annotate(edge, descending)`` can add annotations that depend on where
+    the page starts, such as window functions: it gets the decoded cursor
+    ``(created_at, pk)`` (or None) and whether the page query walks down
+    from it, and returns keyword arguments for ``QuerySet.annotate``.
+    """
+    after = decode_cursor(after)
+    before = decode_cursor(before) if after is None else None
+
+    if before is not None:
+        created_at, pk = before
+        queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+        if annotate is not None:
+            queryset = queryset.annotate(**annotate(before, False))
+        rows = list(queryset.order_by('created_at', 'pk')[:per_page + 1])
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+    else:
+        if after is not None:
+            created_at, pk = after
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+        if annotate is not None:
+            queryset = queryset.annotate(**annotate(after, True))
+        rows = list(queryset.order_by('-created_at', '-pk')[:per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = after is not None
+
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1]) if rows and has_next else None,
+        previous_cursor=encode_cursor(rows[0]) if rows and has_previous else None,
+    )
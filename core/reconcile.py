@@ -0,0 +1,137 @@
+"""
+Ledger reconciliation: compare stored jar balances with their transactions.
+
+A jar's expected balance is its ``opening_balance`` plus the net of its own
+transactions and the transfers it received. ``scan`` computes that for one
+jar-id range with two grouped aggregates and a read of the jar rows, all
+from one snapshot, so ranges can be checked in parallel processes.
+``repair`` moves each drifted balance by its drift with a relative ``F()``
+update, so postings that commit in the meantime are not overwritten.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+
+from core import rollups, versions
+from core.models import Jar, Transaction
+
+CENT = Decimal('0.01')
+AMOUNT_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+class Drift:
+    __slots__ = ('jar_id', 'account_id', 'user_id', 'balance', 'expected')
+
+    def __init__(self, jar_id, account_id, user_id, balance, expected):
+        self.jar_id = jar_id
+        self.account_id = account_id
+        self.user_id = user_id
+        self.balance = balance
+        self.expected = expected
+
+    @property
+    def amount(self):
+        """What has to be added to the stored balance to match the ledger"""
+        return self.expected - self.balance
+
+
+def id_ranges(chunk_size):
+    """Split the jar table into half-open ``(start, stop)`` primary key ranges"""
+    bounds = Jar.objects.order_by().values_list('pk', flat=True)
+    first, last = bounds.order_by('pk').first(), bounds.order_by('-pk').first()
+    if first is None:
+        return []
+    return [(start, min(start + chunk_size, last + 1)) for start in range(first, last + 1, chunk_size)]
+
+
+@contextmanager
+def _snapshot():
+    """Read the aggregates and the balances as of one moment"""
+    if connection.vendor != 'sqlite':
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+            yield
+        return
+    if connection.in_atomic_block:
+        yield
+        return
+    # atomic() begins IMMEDIATE transactions here (see settings), taking the write lock for the
+    # whole scan; a deferred transaction that only reads is a WAL snapshot that blocks no one
+    with connection.cursor() as cursor:
+        cursor.execute('BEGIN DEFERRED')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('COMMIT')
+
+
+def scan(start, stop):
+    """
+    Check the jars with ``start <= pk < stop``.
+
+    Returns ``(jars_checked, [Drift, ...])``.
+    """
+    net = defaultdict(Decimal)
+    with _snapshot():
+        own = (
+            Transaction.objects.filter(jar_id__gte=start, jar_id__lt=stop).order_by()
+            .values('jar_id')
+            .annotate(total=Sum(Case(
+                When(transaction_type='INCOMING', then=F('amount')), default=-F('amount'), output_field=AMOUNT_FIELD,
+            )))
+            .values_list('jar_id', 'total')
+        )
+        for jar_id, total in own:
+            net[jar_id] += total
+        incoming = (
+            Transaction.objects.filter(
+                destination_jar_id__gte=start, destination_jar_id__lt=stop, transaction_type='TRANSFER',
+            ).order_by()
+            .values('destination_jar_id')
+            .annotate(total=Sum('amount'))
+            .values_list('destination_jar_id', 'total')
+        )
+        for jar_id, total in incoming:
+            net[jar_id] += total
+        jars = list(
+            Jar.objects.filter(pk__gte=start, pk__lt=stop).order_by()
+            .values_list('pk', 'account_id', 'account__created_by_id', 'balance', 'opening_balance')
+        )
+
+    drifts = []
+    for jar_id, account_id, user_id, balance, opening in jars:
+        # SQLite sums decimals as floats, so round back to cents
+        expected = (opening + net[jar_id]).quantize(CENT)
+        if balance != expected:
+            drifts.append(Drift(jar_id, account_id, user_id, balance, expected))
+    return len(jars), drifts
+
+
+def repair(drifts, batch_size=500):
+    """
+    Move every drifted jar to its expected balance, one UPDATE per batch.
+
+    The affected users' rollups are rebuilt from the jar table afterwards,
+    since drift may have come from writes that bypassed them too.
+    """
+    drifts = list(drifts)
+    for offset in range(0, len(drifts), batch_size):
+        batch = drifts[offset:offset + batch_size]
+        Jar.objects.filter(pk__in=[drift.jar_id for drift in batch]).update(
+            balance=F('balance') + Case(
+                *[When(pk=drift.jar_id, then=Value(drift.amount)) for drift in batch],
+                output_field=AMOUNT_FIELD,
+            ),
+        )
+    user_ids = sorted({drift.user_id for drift in drifts})
+    if user_ids:
+        rollups.rebuild(user_ids=user_ids)
+    for user_id in user_ids:
+        versions.bump(user_id)
+    return len(drifts)
@@ -0,0 +1,151 @@
+"""
+Denormalized balance rollups.
+
+``AccountRollup`` and ``UserRollup`` hold the per-account and per-user totals
+that the dashboard and account list display, so those pages read a single row
+instead of aggregating every jar on each request. Rows are adjusted in place
+with ``F()`` expressions whenever a jar balance changes and are created lazily
+(from a fresh aggregate) the first time they are read.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from core.models import Account, AccountRollup, UserRollup
+
+
+def adjust(account_id, balance_delta=0, jar_delta=0):
+    """Apply a balance/jar-count delta to an account and its owning user"""
+    if not balance_delta and not jar_delta:
+        return
+    AccountRollup.objects.filter(account_id=account_id).update(
+        balance=F('balance') + balance_delta,
+        jar_count=F('jar_count') + jar_delta,
+    )
+    UserRollup.objects.filter(user__account__id=account_id).update(
+        balance=F('balance') + balance_delta,
+        jar_count=F('jar_count') + jar_delta,
+    )
+
+
+def adjust_balances(account_deltas, user_deltas):
+    """
+    Apply balance deltas keyed by account id and by user id.
+
+    Account rows are all updated before user rows, each in key order, so
+    concurrent postings acquire rollup row locks in a consistent sequence.
+    """
+    for account_id in sorted(account_deltas):
+        if account_deltas[account_id]:
+            AccountRollup.objects.filter(account_id=account_id).update(balance=F('balance') + account_deltas[account_id])
+    for user_id in sorted(user_deltas):
+        if user_deltas[user_id]:
+            UserRollup.objects.filter(user_id=user_id).update(balance=F('balance') + user_deltas[user_id])
+
+
+def adjust_account_count(user_id, delta):
+    UserRollup.objects.filter(user_id=user_id).update(account_count=F('account_count') + delta)
+
+
+def jar_saved(jar, created):
+    """Bring rollups in line with a jar that was just created or updated"""
+    if created:
+        adjust(jar.account_id, jar.balance, 1)
+    else:
+        state = getattr(jar, '_rollup_state', None)
+        if state is None or state[1] is None:
+            # We don't know what was persisted before this save, so recompute
+            rebuild(user_ids=Account.objects.filter(pk=jar.account_id).values('created_by_id'))
+        elif state[0] != jar.account_id:
+            adjust(state[0], -state[1], -1)
+            adjust(jar.account_id, jar.balance, 1)
+        else:
+            adjust(jar.account_id, jar.balance - state[1])
+    jar._rollup_state = (jar.account_id, jar.balance)
+
+
+def jar_deleted(jar):
+    adjust(jar.account_id, -jar.balance, -1)
+
+
+def for_user(user):
+    """Return the user's rollup row, building it on first access"""
+    try:
+        return UserRollup.objects.get(user=user)
+    except UserRollup.DoesNotExist:
+        rebuild(user_ids=[user.pk])
+        return UserRollup.objects.get(user=user)
+
+
+def for_accounts(accounts):
+    """Evaluate an account queryset with ``account.rollup`` loaded for every row"""
+    accounts = list(accounts.select_related('rollup'))
+    missing = [account.pk for account in accounts if not hasattr(account, 'rollup')]
+    if missing:
+        _rebuild_accounts(Account.objects.filter(pk__in=missing))
+        rollups = AccountRollup.objects.in_bulk(missing)
+        for account in accounts:
+            if account.pk in rollups:
+                account.rollup = rollups[account.pk]
+    return accounts
+
+
+def _rebuild_accounts(accounts, batch_size=1000):
+    """Recompute account rollups for ``accounts``; returns per-user totals"""
+    user_totals = {}
+    batch = []
+    totals = (
+        accounts.order_by()
+        .annotate(jar_balance=Sum('jar__balance'), jars=Count('jar'))
+        .values_list('pk', 'created_by_id', 'jar_balance', 'jars')
+    )
+    for account_id, user_id, balance, jars in totals.iterator(chunk_size=batch_size):
+        balance = balance or 0
+        batch.append(AccountRollup(account_id=account_id, balance=balance, jar_count=jars))
+        user_balance, user_jars, user_accounts = user_totals.get(user_id, (0, 0, 0))
+        user_totals[user_id] = (user_balance + balance, user_jars + jars, user_accounts + 1)
+        if len(batch) >= batch_size:
+            _upsert(AccountRollup, batch, 'account', ['balance', 'jar_count'])
+            batch = []
+    if batch:
+        _upsert(AccountRollup, batch, 'account', ['balance', 'jar_count'])
+    return user_totals
+
+
+def _upsert(model, rows, unique_field, update_fields):
+    model.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=[unique_field],
+        update_fields=update_fields,
+    )
+
+
+def rebuild(user_ids=None, batch_size=1000):
+    """
+    Recompute rollups from the jar table.
+
+    When ``user_ids`` is given only those users (and their accounts) are
+    rebuilt, otherwise every user is. Returns the number of user rollups written.
+    """
+    accounts = Account.objects.all()
+    users = User.objects.all()
+    if user_ids is not None:
+        accounts = accounts.filter(created_by_id__in=user_ids)
+        users = users.filter(pk__in=user_ids)
+
+    with transaction.atomic():
+        user_totals = _rebuild_accounts(accounts, batch_size=batch_size)
+        written = 0
+        batch = []
+        for user_id in users.order_by().values_list('pk', flat=True).iterator(chunk_size=batch_size):
+            balance, jars, account_count = user_totals.get(user_id, (0, 0, 0))
+            batch.append(UserRollup(user_id=user_id, balance=balance, jar_count=jars, account_count=account_count))
+            if len(batch) >= batch_size:
+                _upsert(UserRollup, batch, 'user', ['balance', 'jar_count', 'account_count'])
+                written += len(batch)
+                batch = []
+        if batch:
+            _upsert(UserRollup, batch, 'user', ['balance', 'jar_count', 'account_count'])
+            written += len(batch)
+    return written
@@ -0,0 +1,140 @@
+"""
+Full-text search over a transaction's counterparty and description.
+
+PostgreSQL keeps a generated ``tsvector`` column, ``search_vector``, with a
+GIN index on it. SQLite keeps an FTS5 table, ``core_transaction_fts``, that
+indexes the transaction table's rows and is updated by triggers on it. Both
+are maintained by the database itself, so rows written by ``save``,
+``bulk_create`` or ``update`` are searchable as soon as they commit. Neither
+is a model field: ``matching`` narrows a transaction queryset with a
+condition on the index, so a search combines with any other filter and with
+keyset pagination. Other databases fall back to unindexed ``icontains``.
+
+A query matches transactions containing every word of it, each as a prefix
+("gro" finds "Grocery Store"), case-insensitively and without stemming.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'core_transaction_fts'
+FTS_TRIGGERS = {
+    'core_transaction_fts_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS core_transaction_fts_insert AFTER INSERT ON core_transaction BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, source_destination, description)
+            VALUES (new.id, new.source_destination, new.description);
+        END
+    """,
+    'core_transaction_fts_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS core_transaction_fts_delete AFTER DELETE ON core_transaction BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, source_destination, description)
+            VALUES ('delete', old.id, old.source_destination, old.description);
+        END
+    """,
+    'core_transaction_fts_update': f"""
+        CREATE TRIGGER IF NOT EXISTS core_transaction_fts_update
+        AFTER UPDATE OF source_destination, description ON core_transaction BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, source_destination, description)
+            VALUES ('delete', old.id, old.source_destination, old.description);
+            INSERT INTO {FTS_TABLE} (rowid, source_destination, description)
+            VALUES (new.id, new.source_destination, new.description);
+        END
+    """,
+}
+
+# 'simple': lower-cased words without language-specific stemming, like SQLite's FTS5 tokenizer
+PG_CONFIG = 'simple'
+PG_INSTALL = [
+    f"""
+    ALTER TABLE core_transaction ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('{PG_CONFIG}', coalesce(source_destination, '') || ' ' || coalesce(description, ''))
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS core_txn_search_idx ON core_transaction USING gin (search_vector)",
+]
+PG_UNINSTALL = [
+    "DROP INDEX IF EXISTS core_txn_search_idx",
+    "ALTER TABLE core_transaction DROP COLUMN IF EXISTS search_vector",
+]
+
+MAX_TERMS = 10
+
+
+def terms(query):
+    """The words of a search query, as the indexes split them"""
+    return re.findall(r'[^\W_]+', query or '')[:MAX_TERMS]
+
+
+def matching(queryset, query):
+    """Narrow a ``Transaction`` queryset to rows matching every word of ``query``"""
+    words = terms(query)
+    if not words:
+        return queryset
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        # Quoted lexemes, so punctuation in user input cannot form tsquery operators
+        tsquery = ' & '.join("'{}':*".format(word.lower().replace("'", "''")) for word in words)
+        matches = RawSQL(
+            f"{connection.ops.quote_name(queryset.model._meta.db_table)}.search_vector @@ to_tsquery('{PG_CONFIG}', %s)",
+            [tsquery],
+            output_field=BooleanField(),
+        )
+        return queryset.alias(search_match=matches).filter(search_match=True)
+    if connection.vendor == 'sqlite':
+        match = ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+        return queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+    for word in words:
+        queryset = queryset.filter(Q(source_destination__icontains=word) | Q(description__icontains=word))
+    return queryset
+
+
+def install(connection):
+    """Create the search index for ``connection`` and fill it from the existing rows"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for statement in PG_INSTALL:
+                cursor.execute(statement)
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"source_destination, description, content='core_transaction', content_rowid='id')"
+            )
+            for statement in FTS_TRIGGERS.values():
+                cursor.execute(statement)
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def uninstall(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for statement in PG_UNINSTALL:
+                cursor.execute(statement)
+        elif connection.vendor == 'sqlite':
+            for name in FTS_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def repair(connection):
+    """
+    Recreate the SQLite triggers if a migration dropped them.
+
+    SQLite applies most column changes by copying the table into a new one,
+    which drops the table's triggers; the FTS table itself survives. Runs
+    after ``migrate``; does nothing when the index is complete or was never
+    installed.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, name FROM sqlite_master WHERE (type = 'table' AND name = %s) OR "
+            "(type = 'trigger' AND tbl_name = 'core_transaction')",
+            [FTS_TABLE],
+        )
+        found = {name for _, name in cursor.fetchall()}
+    if FTS_TABLE in found and not set(FTS_TRIGGERS) <= found:
+        install(connection)
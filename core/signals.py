@@ -1,28 +1,93 @@
-# signals.py
-from django.db.models.signals import post_save
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from .models import *
+from . import rollups, search, versions
 
 
+# Rollup receivers are registered first so the rows exist before the
+# "Self" owner and "Main" jar receivers below start adjusting them.
 @receiver(post_save, sender=User)
-def create_owner_for_user(sender, instance, created, **kwargs):
-    if created:
-        Owner.objects.create(created_by=instance, name="Self")
+def create_rollup_for_user(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserRollup.objects.get_or_create(user=instance)
 
 
 @receiver(post_save, sender=Account)
-def create_main_jar_for_account(sender, instance, created, **kwargs):
-    if created:
-        try:
-            owner = Owner.objects.get(created_by=instance.created_by, name="Self")
-            Jar.objects.create(
-                name="Main",
-                account=instance,
-                balance=0,
-                owner=owner
-            )
-        except Owner.DoesNotExist:
-            # Optional: log or handle missing owner
-            print("Owner with name 'Self' does not exist for user:", instance.created_by)
-            pass
+def create_rollup_for_account(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AccountRollup.objects.get_or_create(account=instance)
+        rollups.adjust_account_count(instance.created_by_id, 1)
+
+
+@receiver(post_delete, sender=Account)
+def remove_account_from_rollup(sender, instance, **kwargs):
+    rollups.adjust_account_count(instance.created_by_id, -1)
+
+
+@receiver(post_save, sender=Jar)
+def update_rollups_for_jar(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        rollups.jar_saved(instance, created)
+
+
+@receiver(post_delete, sender=Jar)
+def remove_jar_from_rollups(sender, instance, **kwargs):
+    rollups.jar_deleted(instance)
+
+
+# No post_delete here: a Transaction delete receiver would stop Django from
+# deleting a jar's transactions with one DELETE. Jars and accounts bump on
+# their own delete, and the admin bumps when it deletes transactions.
+@receiver(post_save, sender=Transaction)
+def bump_version_for_transaction(sender, instance, **kwargs):
+    versions.bump(instance.created_by_id)
+
+
+@receiver(post_save, sender=Jar)
+@receiver(post_delete, sender=Jar)
+def bump_version_for_jar(sender, instance, **kwargs):
+    # The account may already be gone when jars are removed by a cascade
+    user_id = Account.objects.filter(pk=instance.account_id).values_list('created_by_id', flat=True).first()
+    if user_id is not None:
+        versions.bump(user_id)
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def bump_version_for_account(sender, instance, **kwargs):
+    versions.bump(instance.created_by_id)
+
+
+@receiver(post_save, sender=Owner)
+@receiver(post_delete, sender=Owner)
+def bump_version_for_owner(sender, instance, **kwargs):
+    versions.bump(instance.created_by_id)
+
+
+@receiver(post_save, sender=User)
+def create_owner_for_user(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Owner.objects.create(created_by=instance, name="Self", is_self=True)
+
+
+@receiver(post_save, sender=Account)
+def create_main_jar_for_account(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        owner, _ = Owner.objects.get_or_create(
+            created_by_id=instance.created_by_id, is_self=True, defaults={'name': "Self"},
+        )
+        Jar.objects.create(
+            name="Main",
+            account=instance,
+            balance=0,
+            owner=owner
+        )
+
+
+@receiver(post_migrate)
+def repair_search_index(sender, using, **kwargs):
+    # SQLite rebuilds the transaction table for most schema changes, dropping the search triggers
+    if sender.name == 'core':
+        search.repair(connections[using])
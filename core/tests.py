@@ -1,3 +1,837 @@
-from django.test import TestCase
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.models import Count, Q
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import (
+    aggregates, async_views, checkpoints, dashboard, importers, ledger, metrics, provisioning, reconcile, rollups,
+    search, versions, views,
+)
+from core.forms import BatchTransferForm
+from core.models import Account, AccountRollup, ApiToken, DailyAggregate, Jar, JarCheckpoint, Owner, Transaction, UserRollup
+from core.pagination import encode_cursor, paginate
+from core.signals import repair_search_index
+
+# Templates only need plain static URLs, not the collected manifest
+STATIC_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(STORAGES=STATIC_STORAGES)
+class OwnerViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        self.account = Account.objects.create(name='Wallet', account_number='1', created_by=self.user)
+        self.client.force_login(self.user)
+
+    def add_owners(self, user, account, count, jars_per_owner=4):
+        for index in range(count):
+            owner = Owner.objects.create(name=f'Owner {index}', created_by=user)
+            for jar_index in range(jars_per_owner):
+                Jar.objects.create(name=f'Jar {jar_index}', account=account, owner=owner, balance=Decimal('2.50'))
+
+    def test_query_count_does_not_grow_with_owners(self):
+        self.add_owners(self.user, self.account, 2)
+        # session, user, owners with aggregates, recent jars prefetch
+        with self.assertNumQueries(4):
+            self.client.get(reverse('owner_view'))
+
+        self.add_owners(self.user, self.account, 10)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('owner_view'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_owners_are_scoped_and_annotated(self):
+        self.add_owners(self.user, self.account, 1, jars_per_owner=5)
+        other = User.objects.create_user('bob', password='secret')
+        other_account = Account.objects.create(name='Other', account_number='2', created_by=other)
+        self.add_owners(other, other_account, 3)
+
+        response = self.client.get(reverse('owner_view'))
+
+        owners = {owner.name: owner for owner in response.context['owners']}
+        self.assertEqual(set(owners), {'Self', 'Owner 0'})
+        self.assertEqual(owners['Owner 0'].jar_count, 5)
+        self.assertEqual(owners['Owner 0'].balance, Decimal('12.50'))
+        self.assertEqual(len(owners['Owner 0'].recent_jars), 3)
+        # The account's "Main" jar belongs to the user's Self owner
+        self.assertEqual(response.context['total_jars'], 6)
+        self.assertEqual(response.context['active_owners'], 2)
+
+
+
+@override_settings(
+    STORAGES=STATIC_STORAGES, REQUEST_METRICS=True, REQUEST_METRICS_TOKEN='scrape-secret',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+        # Each request is also logged as a JSON line; keep it out of the test output
+        metrics.logger.disabled = True
+        self.addCleanup(setattr, metrics.logger, 'disabled', False)
+
+    def scrape(self, token='scrape-secret'):
+        return self.client.get(reverse('metrics'), headers={'Authorization': f'Bearer {token}'} if token else {})
+
+    def test_scrape_requires_the_token(self):
+        self.assertEqual(self.scrape(token=None).status_code, 404)
+        self.assertEqual(self.scrape(token='wrong').status_code, 404)
+        self.assertEqual(self.scrape().status_code, 200)
+        with override_settings(REQUEST_METRICS_TOKEN=''):
+            self.assertEqual(self.scrape().status_code, 404)
+
+    def test_scrape_reports_every_worker(self):
+        other = metrics.Registry()
+        other.worker = 'other-host:42'
+        other.observe('home', 200, metrics.RequestMetrics(), 0.02, False)
+        self.client.get(reverse('account_login'))
+
+        body = self.scrape().content.decode()
+
+        self.assertIn('balance_jar_requests_total{worker="other-host:42",view="home",status="200"} 1', body)
+        self.assertIn(f'balance_jar_requests_total{{worker="{metrics.registry.worker}",view="account_login",status="200"}} 1', body)
+
+
+class ImportTests(TestCase):
+    CSV = (
+        "date,amount,payee,description\n"
+        "2025-03-01,-4.50,Coffee Shop,\n"
+        "2025-03-01,-4.50,Coffee Shop,\n"
+        "2025-03-02,1000,Salary,March\n"
+    )
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        account = Account.objects.create(name='Wallet', account_number='1', created_by=self.user)
+        self.jar = Jar.objects.get(account=account, name='Main')
+        Jar.objects.filter(pk=self.jar.pk).update(balance=Decimal('100.00'))
+
+    def run_import(self, text, **kwargs):
+        return importers.import_rows(importers.read_csv(io.StringIO(text)), self.user, default_jar_id=self.jar.pk, **kwargs)
+
+    def test_identical_rows_in_one_file_are_kept(self):
+        stats = self.run_import(self.CSV, chunk_size=2)
+
+        self.assertEqual(stats, {'imported': 3, 'duplicates': 0})
+        self.assertEqual(Transaction.objects.filter(source_destination='Coffee Shop').count(), 2)
+        self.jar.refresh_from_db()
+        self.assertEqual(self.jar.balance, Decimal('1091.00'))
+
+    def test_reimport_is_a_no_op(self):
+        self.run_import(self.CSV)
+        stats = self.run_import(self.CSV)
+
+        self.assertEqual(stats, {'imported': 0, 'duplicates': 3})
+        self.assertEqual(Transaction.objects.count(), 3)
+        self.jar.refresh_from_db()
+        self.assertEqual(self.jar.balance, Decimal('1091.00'))
+
+    def test_repeated_reference_is_a_duplicate(self):
+        text = "date,amount,payee,reference\n2025-03-01,-4.50,Coffee Shop,T1\n2025-03-01,-4.50,Coffee Shop,T1\n"
+        self.assertEqual(self.run_import(text), {'imported': 1, 'duplicates': 1})
+
+    def test_non_finite_amount_is_a_row_error(self):
+        for amount in ('NaN', 'sNaN', 'Infinity', '-inf'):
+            with self.subTest(amount=amount), self.assertRaises(importers.ImportRowError) as raised:
+                self.run_import(f"date,amount\n2025-03-01,{amount}\n")
+            self.assertEqual(raised.exception.line, 2)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_oversized_amount_is_a_row_error(self):
+        with self.assertRaises(importers.ImportRowError) as raised:
+            self.run_import("date,amount\n2025-03-01,99999999.99\n2025-03-02,100000000\n")
+        self.assertEqual(raised.exception.line, 3)
+
+    def test_repeats_are_only_remembered_for_the_current_day(self):
+        repeats = importers._Repeats()
+        days = [datetime(2025, 3, day).date() for day in (1, 1, 2)]
+        self.assertEqual([repeats.next(day, 'coffee') for day in days], [0, 1, 0])
+        self.assertEqual(len(repeats.seen), 1)
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        account = Account.objects.create(name='Wallet', account_number='1', created_by=self.user)
+        self.main = Jar.objects.get(account=account, name='Main')
+        self.savings = Jar.objects.create(name='Savings', account=account, owner=self.main.owner, balance=Decimal('50.00'))
+        Jar.objects.filter(pk=self.main.pk).update(balance=Decimal('100.00'))
+        _, self.key = ApiToken.issue(self.user, 'tests')
+
+        other = User.objects.create_user('bob', password='secret')
+        other_account = Account.objects.create(name='Other', account_number='2', created_by=other)
+        self.foreign = Jar.objects.get(account=other_account, name='Main')
+
+    def post(self, records, key=None):
+        return self.client.post(
+            reverse('api_transactions'), data=json.dumps({'transactions': records}), content_type='application/json',
+            HTTP_AUTHORIZATION=f"Bearer {key or self.key}",
+        )
+
+    def balances(self):
+        return dict(Jar.objects.filter(pk__in=[self.main.pk, self.savings.pk]).values_list('name', 'balance'))
+
+    def test_missing_or_invalid_token_is_rejected(self):
+        self.assertEqual(self.client.get(reverse('api_jar_list')).status_code, 401)
+        response = self.client.get(reverse('api_jar_list'), HTTP_AUTHORIZATION='Bearer not-a-key')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.post([{'type': 'INCOMING', 'jar': self.main.pk, 'amount': '1'}], key='wrong').status_code, 401)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_invalid_records_are_listed_by_index(self):
+        response = self.post([
+            {'type': 'INCOMING', 'jar': self.main.pk, 'amount': '10'},
+            {'type': 'INCOMING', 'jar': self.main.pk, 'amount': 'NaN'},
+            {'type': 'OUTGOING', 'jar': self.main.pk, 'amount': 'Infinity'},
+            {'type': 'REFUND', 'jar': self.main.pk, 'amount': '1'},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1, 2, 3])
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_overdraw_rejects_the_whole_batch(self):
+        response = self.post([
+            {'type': 'INCOMING', 'jar': self.savings.pk, 'amount': '10'},
+            {'type': 'OUTGOING', 'jar': self.main.pk, 'amount': '100.01'},
+        ])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['jar'], self.main.pk)
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(self.balances(), {'Main': Decimal('100.00'), 'Savings': Decimal('50.00')})
+
+    def test_batch_commits_together(self):
+        response = self.post([
+            {'type': 'OUTGOING', 'jar': self.main.pk, 'amount': '120', 'source_destination': 'Rent'},
+            {'type': 'INCOMING', 'jar': self.main.pk, 'amount': '30'},
+            {'type': 'TRANSFER', 'jar': self.savings.pk, 'destination_jar': self.main.pk, 'amount': '20'},
+        ])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['transactions']), 3)
+        self.assertEqual(Transaction.objects.count(), 3)
+        self.assertEqual(self.balances(), {'Main': Decimal('30.00'), 'Savings': Decimal('30.00')})
+
+    def test_other_users_jars_are_invisible(self):
+        response = self.post([{'type': 'TRANSFER', 'jar': self.main.pk, 'destination_jar': self.foreign.pk, 'amount': '1'}])
+        self.assertEqual(response.status_code, 400)
+        response = self.post([{'type': 'INCOMING', 'jar': self.foreign.pk, 'amount': '1'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Transaction.objects.exists())
+
+        auth = {'HTTP_AUTHORIZATION': f"Bearer {self.key}"}
+        self.assertEqual(self.client.get(reverse('api_jar_detail', args=[self.foreign.pk]), **auth).status_code, 404)
+        jars = self.client.get(reverse('api_jar_list'), **auth).json()['results']
+        self.assertEqual({jar['id'] for jar in jars}, {self.main.pk, self.savings.pk})
+
+
+class ReconcileTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        account = Account.objects.create(name='Wallet', account_number='1', created_by=self.user)
+        self.main = Jar.objects.get(account=account, name='Main')
+        self.savings = Jar.objects.create(name='Savings', account=account, owner=self.main.owner, balance=Decimal('40.00'))
+        Transaction.objects.create(
+            jar=self.main, transaction_type='INCOMING', amount=Decimal('100.00'), source_destination='Salary',
+            created_by=self.user,
+        )
+        Transaction.objects.create(
+            jar=self.main, destination_jar=self.savings, transaction_type='TRANSFER', amount=Decimal('25.00'),
+            created_by=self.user,
+        )
+
+    def scan(self):
+        bounds = reconcile.id_ranges(1000)
+        self.assertEqual(len(bounds), 1)
+        return reconcile.scan(*bounds[0])
+
+    def test_scan_repair_rescan(self):
+        self.assertEqual(self.scan()[1], [])
+        # A balance edited without a transaction, bypassing the rollups
+        Jar.objects.filter(pk=self.savings.pk).update(balance=Decimal('1000.00'))
+
+        checked, drifts = self.scan()
+        self.assertEqual(checked, 2)
+        self.assertEqual([(drift.jar_id, drift.expected, drift.amount) for drift in drifts],
+                         [(self.savings.pk, Decimal('65.00'), Decimal('-935.00'))])
+
+        self.assertEqual(reconcile.repair(drifts), 1)
+        self.savings.refresh_from_db()
+        self.assertEqual(self.savings.balance, Decimal('65.00'))
+        self.assertEqual(UserRollup.objects.get(user=self.user).balance, Decimal('140.00'))
+        self.assertEqual(AccountRollup.objects.get(account=self.savings.account).balance, Decimal('140.00'))
+        self.assertEqual(self.scan()[1], [])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class LedgerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='secret')
+        self.account = Account.objects.create(name='Wallet', account_number='1', created_by=self.user)
+        self.main = Jar.objects.get(account=self.account, name='Main')
+        self.savings = Jar.objects.create(name='Savings', account=self.account, owner=self.main.owner, balance=Decimal('50.00'))
+        ledger.post({self.main.pk: Decimal('100.00')})
+
+    def balances(self):
+        return dict(Jar.objects.filter(account=self.account).values_list('name', 'balance'))
+
+    def assertRollups(self, balance):
+        self.assertEqual(AccountRollup.objects.get(account=self.account).balance, balance)
+        self.assertEqual(UserRollup.objects.get(user=self.user).balance, balance)
+
+    def test_failed_debit_rolls_back_the_whole_posting(self):
+        # The main jar is credited first (lower pk), then the savings debit fails
+        with self.assertRaises(ledger.InsufficientBalance) as raised:
+            ledger.post({self.main.pk: Decimal('10.00'), self.savings.pk: Decimal('-50.01')})
+
+        self.assertEqual(raised.exception.jar_id, self.savings.pk)
+        self.assertEqual(self.balances(), {'Main': Decimal('100.00'), 'Savings': Decimal('50.00')})
+        self.assertRollups(Decimal('150.00'))
+
+    def test_overdrawing_save_writes_nothing(self):
+        txn = Transaction(jar=self.main, transaction_type='OUTGOING', amount=Decimal('100.01'), created_by=self.user)
+        with self.assertRaises(ledger.InsufficientBalance):
+            txn.save()
+
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(self.balances(), {'Main': Decimal('100.00'), 'Savings': Decimal('50.00')})
+
+    def test_failed_row_insert_rolls_back_the_balance(self):
+        first = Transaction(jar=self.main, transaction_type='OUTGOING', amount=Decimal('10.00'), created_by=self.user)
+        first.import_hash = 'same'
+        first.save()
+        second = Transaction(jar=self.main, transaction_type='OUTGOING', amount=Decimal('20.00'), created_by=self.user)
+        second.import_hash = 'same'
+        with self.assertRaises(IntegrityError):
+            second.save()
+
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(self.balances(), {'Main': Decimal('90.00'), 'Savings': Decimal('50.00')})
+        self.assertRollups(Decimal('140.00'))
+
+    def test_transfer_updates_both_jars_in_pk_order(self):
+        txn = Transaction(
+            jar=self.savings, destination_jar=self.main, transaction_type='TRANSFER', amount=Decimal('20.00'),
+            created_by=self.user,
+        )
+        with CaptureQueriesContext(connection) as queries:
+            txn.save()
+
+        updated = [
+            jar_id for query in queries.captured_queries if query['sql'].startswith('UPDATE "core_jar"')
+            for jar_id in (self.main.pk, self.savings.pk) if f'"core_jar"."id" = {jar_id}' in query['sql']
+        ]
+        self.assertEqual(updated, [self.main.pk, self.savings.pk])
+        self.assertEqual(self.balances(), {'Main': Decimal('120.00'), 'Savings': Decimal('30.00')})
+        self.assertEqual(txn.jar.balance, Decimal('30.00'))
+        self.assertEqual(txn.destination_jar.balance, Decimal('120.00'))
+        self.assertRollups(Decimal('150.00'))
+
+    def test_posting_moves_rollups_and_bumps_the_version(self):
+        before = versions.current(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            ledger.create_transactions([
+                Transaction(jar=self.main, transaction_type='OUTGOING', amount=Decimal('30.00'), created_by=self.user),
+                Transaction(jar=self.savings, transaction_type='INCOMING', amount=Decimal('5.00'), created_by=self.user),
+            ])
+
+        self.assertEqual(self.balances(), {'Main': Decimal('70.00'), 'Savings': Decimal('55.00')})
+        self.assertRollups(Decimal('125.00'))
+        self.assertNotEqual(versions.current(self.user.pk), before)
+
+    def test_deleting_a_jar_removes_its_transactions_in_one_statement(self):
+        ledger.create_transactions([
+            Transaction(jar=self.savings, transaction_type='INCOMING', amount=Decimal('1.00'), created_by=self.user)
+            for _ in range(30)
+        ])
+        before = versions.current(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with CaptureQueriesContext(connection) as queries:
+                self.savings.delete()
+
+        statements = [query['sql'] for query in queries.captured_queries if 'core_transaction' in query['sql']]
+        self.assertFalse([sql for sql in statements if sql.startswith('SELECT')])
+        self.assertLessEqual(len(callbacks), 2)
+        self.assertFalse(Transaction.objects.exists())
+        self.assertNotEqual(versions.current(self.user.pk), before)
+
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        account = Account.objects.create(name='Wallet', account_number='1', created_by=self.user)
+        self.jar = Jar.objects.get(account=account, name='Main')
+
+    def income(self, amount):
+        Transaction.objects.create(
+            jar=self.jar, transaction_type='INCOMING', amount=Decimal(amount), source_destination='Salary',
+            created_by=self.user,
+        )
+
+    def test_summary_follows_the_ledger_within_a_test(self):
+        # Version bumps wait for on_commit, which never fires inside TestCase;
+        # tests only see fresh figures because they do not share a persistent cache
+        self.income('5.00')
+        self.assertEqual(dashboard.get_summary(self.user)['total_income'], Decimal('5.00'))
+        self.income('2.00')
+        self.assertEqual(dashboard.get_summary(self.user)['total_income'], Decimal('7.00'))
+
+    @override_settings(
+        STORAGES=STATIC_STORAGES, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    )
+    def test_async_home_only_queries_on_a_fragment_miss(self):
+        cache.clear()
+        self.income('5.00')
+
+        def get():
+            request = RequestFactory().get(reverse('home'))
+            request.user = self.user
+
+            async def auser():
+                return self.user
+            request.auser = auser
+            with CaptureQueriesContext(connection) as queries:
+                response = async_to_sync(async_views.home)(request)
+            self.assertContains(response, '5.00')
+            return [query['sql'] for query in queries.captured_queries if 'core_' in query['sql']]
+
+        self.assertTrue(get())
+        self.assertEqual(get(), [])
+
+
+@override_settings(STORAGES=STATIC_STORAGES)
+class TransactionListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        account = Account.objects.create(name='Wallet', account_number='1', created_by=self.user)
+        self.main = Jar.objects.get(account=account, name='Main')
+        self.savings = Jar.objects.create(name='Savings', account=account, owner=self.main.owner, balance=0)
+        other = User.objects.create_user('bob', password='secret')
+        other_account = Account.objects.create(name='Other', account_number='2', created_by=other)
+        self.other_jar = Jar.objects.get(account=other_account, name='Main')
+        now = timezone.now()
+        ledger.create_transactions([
+            Transaction(jar=jar, transaction_type='INCOMING', amount=Decimal('1.00'), source_destination='Salary',
+                        created_by=jar.account.created_by, created_at=now - timezone.timedelta(minutes=index // 2))
+            for index in range(7) for jar in (self.main, self.savings, self.other_jar)
+        ])
+        self.client.force_login(self.user)
+
+    def test_keyset_pages_walk_every_jar_of_the_user(self):
+        seen, after = [], None
+        while True:
+            response = self.client.get(reverse('all_transactions'), {'after': after} if after else {})
+            page = response.context['page']
+            seen += [txn.pk for txn in page]
+            if not page.has_next:
+                break
+            after = page.next_cursor
+        expected = Transaction.objects.filter(jar__account__created_by=self.user).order_by('-created_at', '-pk')
+        self.assertEqual(seen, list(expected.values_list('pk', flat=True)))
+        self.assertEqual(response.context['total_income'], Decimal('14.00'))
+
+    @skipUnless(connection.vendor == 'sqlite', "SQLite query plan")
+    def test_page_query_reads_the_index_in_order(self):
+        request = RequestFactory().get(reverse('all_transactions'), {'type': 'INCOMING'})
+        request.user = self.user
+        transactions, _ = views._filtered_transactions(request)
+        plan = transactions.order_by('-created_at', '-pk')[:51].explain()
+        self.assertIn('core_txn_user_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_totals_are_computed_once_per_ledger_version(self):
+        cache.clear()
+        first = self.client.get(reverse('all_transactions'))
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(reverse('all_transactions'), {'after': encode_cursor(first.context['page'].object_list[0])})
+        self.assertEqual(len(second.context['page']), len(first.context['page']) - 1)
+        self.assertEqual(second.context['total_income'], Decimal('14.00'))
+        self.assertFalse([query for query in queries.captured_queries if 'total_income' in query['sql']])
+
+    def test_export_writes_local_timestamps(self):
+        response = self.client.get(reverse('export_transactions'), {'format': 'jsonl', 'jar': self.main.pk})
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        newest = Transaction.objects.filter(jar=self.main).order_by('-created_at', '-pk').first()
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[0]['created_at'], timezone.localtime(newest.created_at).isoformat())
+
+    def test_non_numeric_ids_are_a_bad_request(self):
+        for name in ('all_transactions', 'export_transactions'):
+            for params in ({'account': 'abc'}, {'jar': '1 OR 1=1'}):
+                with self.subTest(view=name, params=params):
+                    self.assertEqual(self.client.get(reverse(name), params).status_code, 400)
+
+
+@override_settings(STORAGES=STATIC_STORAGES)
+class BatchTransferTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        account = Account.objects.create(name='Wallet', account_number='1', created_by=self.user)
+        owner = Owner.objects.get(created_by=self.user, is_self=True)
+        # Destinations on both sides of the source's pk, so one is credited before the source is debited
+        self.rent = Jar.objects.create(name='Rent', account=account, owner=owner, balance=0)
+        self.source = Jar.objects.create(name='Salary', account=account, owner=owner, balance=0)
+        self.fun = Jar.objects.create(name='Fun', account=account, owner=owner, balance=0)
+        ledger.post({self.source.pk: Decimal('100.00')})
+        self.client.force_login(self.user)
+
+    def post(self, *legs):
+        data = {
+            'source_jar': self.source.pk,
+            'created_at': '2025-03-01T09:00',
+            'legs-TOTAL_FORMS': len(legs),
+            'legs-INITIAL_FORMS': 0,
+            'legs-MIN_NUM_FORMS': 1,
+            'legs-MAX_NUM_FORMS': 50,
+        }
+        for index, (jar, amount) in enumerate(legs):
+            data[f'legs-{index}-destination_jar'] = jar.pk
+            data[f'legs-{index}-amount'] = amount
+        return self.client.post(reverse('batch_transfer'), data)
+
+    def balances(self):
+        return {jar.name: jar.balance for jar in Jar.objects.filter(pk__in=[self.rent.pk, self.source.pk, self.fun.pk])}
+
+    def test_split_transfer_moves_every_leg(self):
+        response = self.post((self.rent, '60.00'), (self.fun, '25.50'))
+
+        self.assertRedirects(response, reverse('all_transactions'), fetch_redirect_response=False)
+        self.assertEqual(self.balances(), {'Rent': Decimal('60.00'), 'Salary': Decimal('14.50'), 'Fun': Decimal('25.50')})
+        self.assertEqual(Transaction.objects.filter(transaction_type='TRANSFER', jar=self.source).count(), 2)
+        self.assertEqual(AccountRollup.objects.get(account=self.source.account).balance, Decimal('100.00'))
+
+    def test_split_that_would_overdraw_is_rejected(self):
+        response = self.post((self.rent, '60.00'), (self.fun, '40.01'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Insufficient balance in Salary', str(response.context['form'].non_field_errors()))
+        self.assertFalse(Transaction.objects.filter(transaction_type='TRANSFER').exists())
+
+    def test_duplicate_destination_is_rejected(self):
+        response = self.post((self.rent, '10.00'), (self.rent, '20.00'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('only be used once', str(response.context['legs'].non_form_errors()))
+        self.assertFalse(Transaction.objects.filter(transaction_type='TRANSFER').exists())
+
+    def test_failing_leg_rolls_back_the_whole_batch(self):
+        form = BatchTransferForm({
+            'source_jar': self.source.pk, 'created_at': '2025-03-01T09:00',
+            'legs-TOTAL_FORMS': 2, 'legs-INITIAL_FORMS': 0,
+            'legs-0-destination_jar': self.rent.pk, 'legs-0-amount': '60.00',
+            'legs-1-destination_jar': self.fun.pk, 'legs-1-amount': '30.00',
+        }, user=self.user)
+        self.assertTrue(form.is_valid())
+        # The source is spent after validation, so the debit fails once Rent has been credited
+        ledger.post({self.source.pk: Decimal('-50.00')})
+
+        with self.assertRaises(ledger.InsufficientBalance):
+            form.save(self.user)
+
+        self.assertEqual(self.balances(), {'Rent': Decimal('0.00'), 'Salary': Decimal('50.00'), 'Fun': Decimal('0.00')})
+        self.assertFalse(Transaction.objects.filter(transaction_type='TRANSFER').exists())
+
+
+class AggregateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        account = Account.objects.create(name='Wallet', account_number='1', created_by=self.user)
+        self.main = Jar.objects.get(account=account, name='Main')
+        self.savings = Jar.objects.create(name='Savings', account=account, owner=self.main.owner, balance=0)
+        other = Account.objects.create(name='Card', account_number='2', created_by=self.user)
+        self.card = Jar.objects.get(account=other, name='Main')
+
+    def at(self, day, hour):
+        return timezone.make_aware(datetime(2025, 3, day, hour))
+
+    def post(self, transaction_type, jar, amount, when, counterparty='', destination=None):
+        Transaction.objects.create(
+            jar=jar, destination_jar=destination, transaction_type=transaction_type, amount=Decimal(amount),
+            source_destination=counterparty, created_by=self.user, created_at=when,
+        )
+
+    def buckets(self):
+        return sorted(
+            DailyAggregate.objects.values_list(
+                'user_id', 'account_id', 'jar_id', 'day', 'source_destination',
+                'income', 'expenses', 'transfers_in', 'transfers_out', 'transaction_count',
+            )
+        )
+
+    def test_recorded_buckets_match_a_rebuild(self):
+        self.post('INCOMING', self.main, '500.00', self.at(1, 9), 'Salary')
+        self.post('INCOMING', self.main, '20.00', self.at(1, 23), 'Salary')
+        # 00:30 local time is still the previous day in UTC
+        self.post('OUTGOING', self.main, '4.50', self.at(2, 0), 'Coffee')
+        self.post('OUTGOING', self.main, '5.50', self.at(2, 8), 'Coffee')
+        self.post('TRANSFER', self.main, '100.00', self.at(2, 10), destination=self.savings)
+        self.post('TRANSFER', self.main, '50.00', self.at(2, 11), destination=self.card)
+        # Savings both receives from and sends back to Main on the same day, and
+        # Main's outgoing-transfer bucket to Savings shares its key with the incoming one
+        self.post('TRANSFER', self.savings, '30.00', self.at(2, 12), destination=self.main)
+        self.post('TRANSFER', self.savings, '10.00', self.at(2, 13), destination=self.card)
+        self.post('OUTGOING', self.card, '15.00', self.at(3, 18), 'Groceries')
+
+        recorded = self.buckets()
+        main_from_savings = DailyAggregate.objects.get(jar=self.main, day=self.at(2, 12).date(), source_destination='Savings (Wallet)')
+        self.assertEqual(
+            (main_from_savings.transfers_in, main_from_savings.transfers_out, main_from_savings.transaction_count),
+            (Decimal('30.00'), Decimal('100.00'), 2),
+        )
+        self.assertEqual(
+            DailyAggregate.objects.get(jar=self.main, source_destination='Coffee').expenses, Decimal('10.00'),
+        )
+
+        written = aggregates.rebuild()
+
+        self.assertEqual(written, len(recorded))
+        self.assertEqual(self.buckets(), recorded)
+        self.assertEqual(aggregates.rebuild(user_ids=[self.user.pk]), len(recorded))
+        self.assertEqual(self.buckets(), recorded)
+
+
+class CheckpointTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        account = Account.objects.create(name='Wallet', account_number='1', created_by=self.user)
+        self.jar = Jar.objects.create(name='Bills', account=account, owner=Owner.objects.get(created_by=self.user),
+                                      balance=Decimal('10.00'))
+        self.other = Jar.objects.get(account=account, name='Main')
+        self.post('INCOMING', '100.00', day=1, hour=9)
+        self.post('OUTGOING', '30.00', day=1, hour=18)
+        self.post('INCOMING', '5.00', day=3, hour=12)
+        self.post('TRANSFER', '20.00', day=3, hour=12)
+        self.post('TRANSFER', '7.50', day=4, hour=8, incoming=True)
+        self.post('OUTGOING', '12.25', day=6, hour=23)
+
+    def at(self, day, hour=0):
+        return timezone.make_aware(datetime(2025, 3, day, hour))
+
+    def post(self, transaction_type, amount, day, hour, incoming=False):
+        if incoming:
+            # Fund the other jar so it can transfer into this one
+            ledger.post({self.other.pk: Decimal(amount)})
+            source, destination = self.other, self.jar
+        else:
+            source, destination = self.jar, (self.other if transaction_type == 'TRANSFER' else None)
+        Transaction.objects.create(
+            jar=source, destination_jar=destination, transaction_type=transaction_type, amount=Decimal(amount),
+            source_destination='Test', created_by=self.user, created_at=self.at(day, hour),
+        )
+
+    def stored(self):
+        return list(JarCheckpoint.objects.filter(jar=self.jar).order_by('at').values_list('at', 'balance'))
+
+    def history(self):
+        """(pk, balance after the row) for every transaction of the jar, oldest first, replayed from scratch"""
+        balance, rows = self.jar.opening_balance, []
+        for txn in checkpoints.jar_transactions(self.jar.pk).order_by('created_at', 'pk'):
+            balance += txn.amount if txn.transaction_type == 'INCOMING' or txn.destination_jar_id == self.jar.pk else -txn.amount
+            rows.append((txn.pk, balance))
+        return rows
+
+    def test_checkpoints_hold_the_balance_at_day_start(self):
+        self.assertEqual(self.stored(), [
+            (self.at(1), Decimal('10.00')),
+            (self.at(3), Decimal('80.00')),
+            (self.at(4), Decimal('65.00')),
+            (self.at(6), Decimal('72.50')),
+        ])
+        self.jar.refresh_from_db()
+        self.assertEqual(self.jar.balance, Decimal('60.25'))
+        self.assertEqual(checkpoints.balance_at(self.jar, self.at(3, 12)), Decimal('65.00'))
+        self.assertEqual(checkpoints.balance_at(self.jar, self.at(5)), Decimal('72.50'))
+        self.assertEqual(checkpoints.balance_before(self.jar.pk), Decimal('60.25'))
+
+    def test_rebuild_matches_incremental_checkpoints(self):
+        incremental = self.stored()
+        checkpoints.rebuild(jar_ids=[self.jar.pk])
+        self.assertEqual(self.stored(), incremental)
+
+    def test_backdated_transaction_moves_later_checkpoints(self):
+        self.post('OUTGOING', '4.00', day=2, hour=10)
+
+        self.assertEqual(self.stored(), [
+            (self.at(1), Decimal('10.00')),
+            (self.at(2), Decimal('80.00')),
+            (self.at(3), Decimal('76.00')),
+            (self.at(4), Decimal('61.00')),
+            (self.at(6), Decimal('68.50')),
+        ])
+        incremental = self.stored()
+        checkpoints.rebuild(jar_ids=[self.jar.pk])
+        self.assertEqual(self.stored(), incremental)
+
+    def test_running_balance_across_pages(self):
+        expected = dict(self.history())
+        annotate = checkpoints.running_balance(self.jar.pk)
+        queryset = checkpoints.jar_transactions(self.jar.pk)
+
+        pages, after = [], None
+        while True:
+            page = paginate(queryset, after=after, per_page=2, annotate=annotate)
+            pages.append(page)
+            self.assertEqual({txn.pk: txn.running_balance for txn in page}, {txn.pk: expected[txn.pk] for txn in page})
+            if not page.has_next:
+                break
+            after = page.next_cursor
+        self.assertEqual(sum(len(page) for page in pages), len(expected))
+
+        # Walking back up from the last page gives the same numbers
+        back = paginate(queryset, before=pages[-1].previous_cursor, per_page=2, annotate=annotate)
+        self.assertEqual([txn.pk for txn in back], [txn.pk for txn in pages[-2]])
+        self.assertEqual({txn.pk: txn.running_balance for txn in back}, {txn.pk: expected[txn.pk] for txn in back})
+
+
+class ProvisioningTests(TestCase):
+    SPECS = [
+        {'username': 'alice', 'email': 'alice@example.com', 'accounts': [
+            {'name': 'Wallet', 'account_number': '1'},
+            {'name': 'Bank', 'account_number': '2', 'account_type': 'SAVINGS'},
+        ]},
+        {'username': 'bob', 'password': 'own-password', 'accounts': [{'name': 'Wallet', 'account_number': '3'}]},
+        {'username': 'carol'},
+    ]
+
+    def rollup_rows(self):
+        return (
+            sorted(UserRollup.objects.values_list('user__username', 'balance', 'jar_count', 'account_count')),
+            sorted(AccountRollup.objects.values_list('account__account_number', 'balance', 'jar_count')),
+        )
+
+    def test_provisioned_users_match_signal_created_ones(self):
+        users = provisioning.provision_users(self.SPECS, password='shared-password')
+
+        self.assertEqual([user.username for user in users], ['alice', 'bob', 'carol'])
+        for user in users:
+            self.assertEqual(list(Owner.objects.filter(created_by=user).values_list('name', 'is_self')), [('Self', True)])
+        self.assertTrue(User.objects.get(username='alice').check_password('shared-password'))
+        self.assertTrue(User.objects.get(username='bob').check_password('own-password'))
+        jars = Jar.objects.filter(account__created_by__username='alice')
+        self.assertEqual(sorted(jars.values_list('name', 'account__name', 'owner__is_self')),
+                         [('Main', 'Bank', True), ('Main', 'Wallet', True)])
+
+        provisioned = self.rollup_rows()
+        rollups.rebuild()
+        self.assertEqual(self.rollup_rows(), provisioned)
+
+        # Accounts added later through the ORM find the stored Self owner
+        bob = User.objects.get(username='bob')
+        account = Account.objects.create(name='Card', account_number='4', created_by=bob)
+        self.assertTrue(Jar.objects.get(account=account).owner.is_self)
+
+        # Posting into provisioned jars keeps the ledger consistent
+        jar = jars.get(account__name='Wallet')
+        Transaction.objects.create(jar=jar, transaction_type='INCOMING', amount=Decimal('25.00'), created_by=jar.account.created_by)
+        for bounds in reconcile.id_ranges(1000):
+            self.assertEqual(reconcile.scan(*bounds)[1], [])
+        self.assertEqual(UserRollup.objects.get(user__username='alice').balance, Decimal('25.00'))
+
+    def test_invalid_batch_writes_nothing(self):
+        User.objects.create_user('carol')
+        with self.assertRaises(provisioning.ProvisioningError):
+            provisioning.provision_users(self.SPECS)
+        with self.assertRaises(provisioning.ProvisioningError):
+            provisioning.provision_users([{'username': 'dave'}, {'username': 'dave'}])
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['carol'])
+
+    def test_seed_ledger_builds_a_consistent_ledger(self):
+        call_command('seed_ledger', users=3, transactions=300, seed=1, stdout=io.StringIO())
+
+        self.assertEqual(Owner.objects.filter(is_self=True).count(), 3)
+        self.assertFalse(Owner.objects.values('created_by').annotate(n=Count('pk', filter=Q(is_self=True)))
+                         .exclude(n=1).exists())
+        seeded = self.rollup_rows()
+        rollups.rebuild()
+        self.assertEqual(self.rollup_rows(), seeded)
+        for bounds in reconcile.id_ranges(1000):
+            self.assertEqual(reconcile.scan(*bounds)[1], [])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        account = Account.objects.create(name='Wallet', account_number='1', created_by=self.user)
+        self.jar = Jar.objects.get(account=account, name='Main')
+        self.salary = self.add('INCOMING', 'Acme Payroll', 'March salary', Decimal('100.00'))
+        self.rent = self.add('OUTGOING', 'Landlord', 'Rent for flat 4-B')
+        self.coffee = self.add('OUTGOING', 'Corner Café', None)
+
+    def add(self, transaction_type, source_destination, description, amount=Decimal('10.00')):
+        return Transaction.objects.create(
+            jar=self.jar, transaction_type=transaction_type, amount=amount,
+            source_destination=source_destination, description=description, created_by=self.user,
+        )
+
+    def search(self, query, queryset=None):
+        return set(search.matching(queryset if queryset is not None else Transaction.objects.all(), query))
+
+    def test_matches_counterparty_and_description_by_word_prefix(self):
+        self.assertEqual(self.search('landlord'), {self.rent})
+        self.assertEqual(self.search('SALA'), {self.salary})
+        self.assertEqual(self.search('café'), {self.coffee})
+        self.assertEqual(self.search('rent flat'), {self.rent})
+        self.assertEqual(self.search('rent salary'), set())
+        self.assertEqual(self.search('  '), {self.salary, self.rent, self.coffee})
+
+    def test_combines_with_other_filters(self):
+        outgoing = Transaction.objects.filter(transaction_type='OUTGOING')
+        self.assertEqual(self.search('march', outgoing), set())
+        self.assertEqual(self.search('corner', outgoing), {self.coffee})
+
+    def test_index_follows_updates_and_deletes(self):
+        Transaction.objects.filter(pk=self.rent.pk).update(source_destination='Property Agency', description=None)
+        self.assertEqual(self.search('landlord'), set())
+        self.assertEqual(self.search('agency'), {self.rent})
+
+        self.coffee.delete()
+        self.assertEqual(self.search('corner'), set())
+
+        created = ledger.create_transactions([
+            Transaction(jar=self.jar, transaction_type='INCOMING', amount=Decimal('1.00'),
+                        source_destination='Refund desk', created_by=self.user),
+        ])
+        self.assertEqual(self.search('refund'), set(created))
+
+    def test_query_syntax_is_never_interpreted(self):
+        for query in ['"', 'rent"', '*', 'rent*', '-rent', 'NOT rent', 'rent OR salary', 'NEAR(rent flat)',
+                      'description:rent', '^rent', '(rent', "o'brien", '4-B', 'rent AND', '+', '%_\\']:
+            with self.subTest(query=query):
+                list(search.matching(Transaction.objects.all(), query))
+        self.assertEqual(self.search('-rent'), {self.rent})
+        self.assertEqual(self.search('rent OR salary'), set())
+        self.assertEqual(self.search('4-B'), {self.rent})
+
+    @skipUnless(connection.vendor == 'sqlite', "SQLite keeps the index with triggers")
+    def test_post_migrate_restores_dropped_triggers(self):
+        with connection.cursor() as cursor:
+            for name in search.FTS_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER {name}")
+
+        repair_search_index(sender=apps.get_app_config('core'), using=connection.alias)
+
+        self.assertEqual(self.search('landlord'), {self.rent})
+        receipt = self.add('OUTGOING', 'Bookshop', None)
+        self.assertEqual(self.search('bookshop'), {receipt})
@@ -1,18 +1,35 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, views
+
+# Read-heavy pages have async versions for ASGI deployments
+read_views = async_views if settings.ASYNC_VIEWS else views
 
 
 urlpatterns = [
-    path('', views.home, name='home'),
+    path('', read_views.home, name='home'),
     path('owners/', views.owner_view, name='owner_view'),
     path('owners/<int:owner_id>/edit/', views.owner_view, name='owner_edit'),
     path('accounts/', views.account_view, name='account_view'),
-    path('accounts/<int:account_id>/', views.account_detail_view, name='account_detail'),
+    path('accounts/<int:account_id>/', read_views.account_detail_view, name='account_detail'),
+
+    # Edit/delete modal bodies, fetched when a row's modal opens
+    path('owners/<int:owner_id>/modal/<slug:action>/', views.owner_modal, name='owner_modal'),
+    path('accounts/<int:account_id>/modal/<slug:action>/', views.account_modal, name='account_modal'),
+    path('jars/<int:jar_id>/modal/<slug:action>/', views.jar_modal, name='jar_modal'),
     
     # Transaction URLs
-    path('transactions/', views.all_transactions, name='all_transactions'),
+    path('transactions/', read_views.all_transactions, name='all_transactions'),
+    path('transactions/export/', views.export_transactions, name='export_transactions'),
     path('jars/<int:jar_id>/add-income/', views.add_incoming_transaction, name='add_incoming_transaction'),
     path('jars/<int:jar_id>/add-expense/', views.add_outgoing_transaction, name='add_outgoing_transaction'),
-    path('jars/<int:jar_id>/transactions/', views.jar_transactions, name='jar_transactions'),
+    path('jars/<int:jar_id>/transactions/', read_views.jar_transactions, name='jar_transactions'),
     path('transfer/', views.transfer_money, name='transfer_money'),
-]
\ No newline at end of file
+    path('transfer/batch/', views.batch_transfer, name='batch_transfer'),
+    path('reports/monthly/', views.monthly_report, name='monthly_report'),
+
+    # JSON API (bearer token auth)
+    path('api/jars/', api.jar_list, name='api_jar_list'),
+    path('api/jars/<int:jar_id>/', api.jar_detail, name='api_jar_detail'),
+    path('api/transactions/', api.transactions, name='api_transactions'),
+]
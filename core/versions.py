@@ -0,0 +1,50 @@
+"""
+Per-user ledger versions.
+
+Each user has a version token in the cache that is replaced whenever their
+ledger (transactions, jars, accounts or owners) is written. Data derived
+from the ledger is cached under a key that includes the current version, so
+one bump makes every stale entry unreachable without tracking or deleting
+individual keys; the old entries simply expire.
+
+Bumps write a fresh random token rather than incrementing: ``incr`` is a
+get-then-set on the file and database caches, so two concurrent writes
+could both move the version to the same N+1 and the second would
+invalidate nothing. Racing ``set`` calls each leave a version no cached
+entry was stored under.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _cache_key(user_id):
+    return f"core:ledger-version:{user_id}"
+
+
+def _seed():
+    # Never reissued, so a version evicted from the cache cannot bring back entries stored under it
+    return uuid.uuid4().hex
+
+
+def current(user_id):
+    """The user's ledger version, created on first use"""
+    key = _cache_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        seed = _seed()
+        cache.add(key, seed, timeout=None)
+        version = cache.get(key, seed)
+    return version
+
+
+def bump(user_id):
+    """Give the user a new version once the surrounding transaction commits"""
+    key = _cache_key(user_id)
+    transaction.on_commit(lambda: cache.set(key, _seed(), timeout=None))
+
+
+def cache_key(prefix, user_id):
+    """Cache key for ``prefix`` data that is valid for the user's current ledger version"""
+    return f"core:{prefix}:{user_id}:{current(user_id)}"
@@ -1,41 +1,45 @@
+import csv
+import itertools
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, OuterRef, Prefetch, Sum
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from core.models import *
 from core.forms import *
+from core import aggregates, caching, checkpoints, dashboard, rollups, search, versions
+from core.expressions import CappedCount
+from core.pagination import paginate
+
+# transaction_count_display renders anything above 100 as "100+"
+TRANSACTION_COUNT_CAP = 101
+
+# Template fragments are keyed by the ledger version, so this only bounds how long unused copies linger
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+REPORT_CACHE_TIMEOUT = 60 * 60
 
 
 @login_required
 def home(request):
-    # Get all accounts for the current user
-    accounts = Account.objects.filter(created_by=request.user)
-    
-    # Calculate total balance and jar count efficiently
-    total_balance = 0
-    total_jars = 0
-    
-    for account in accounts:
-        total_balance += account.total_balance()
-        total_jars += account.jar_set.count()
+    # Read the version first so data fetched below is never cached under a newer one
+    ledger_version = versions.current(request.user.pk)
+
+    # Income, expenses, counts and balances in one cached query, only run when a fragment misses
+    summary = SimpleLazyObject(lambda: dashboard.get_summary(request.user))
     
     # Get recent transactions
-    user_jars = Jar.objects.filter(account__in=accounts)
-    recent_transactions = Transaction.objects.filter(jar__in=user_jars).select_related('jar', 'jar__account', 'jar__owner').order_by('-created_at')[:5]
-    
-    # Calculate transaction statistics
-    all_transactions = Transaction.objects.filter(jar__in=user_jars)
-    total_income = sum(t.amount for t in all_transactions if t.transaction_type == 'INCOMING')
-    total_expenses = sum(t.amount for t in all_transactions if t.transaction_type == 'OUTGOING')
-    total_transactions = all_transactions.count()
+    recent_transactions = Transaction.objects.filter(jar__account__created_by=request.user).select_related('jar', 'jar__account', 'jar__owner').order_by('-created_at')[:5]
     
     context = {
-        'total_balance': total_balance,
-        'total_jars': total_jars,
-        'account_count': accounts.count(),
         'recent_transactions': recent_transactions,
-        'total_income': total_income,
-        'total_expenses': total_expenses,
-        'total_transactions': total_transactions,
+        'summary': summary,
+        'ledger_version': ledger_version,
+        'fragment_timeout': FRAGMENT_CACHE_TIMEOUT,
     }
     
     return render(request, 'core/index.html', context)
@@ -43,21 +47,31 @@ def home(request):
 
 @login_required
 def owner_view(request):
-    owners = Owner.objects.all()
+    # Jar counts and balances are aggregated per owner in the owner query; the
+    # three-jar preview is a single windowed prefetch
+    owners = list(
+        Owner.objects.filter(created_by=request.user)
+        .annotate(jar_count=Count('jar'), balance=Sum('jar__balance', default=0))
+        .prefetch_related(Prefetch(
+            'jar_set',
+            queryset=Jar.objects.select_related('account').order_by('-created_at', '-pk')[:3],
+            to_attr='recent_jars',
+        ))
+        .order_by('created_at', 'pk')
+    )
     form = OwnerForm()
-    owner_forms_dict = {owner.id: OwnerForm(instance=owner) for owner in owners}
 
     # Calculate statistics
-    total_jars = sum(owner.jar_set.count() for owner in owners)
-    active_owners = sum(1 for owner in owners if owner.jar_set.count() > 0)
+    total_jars = sum(owner.jar_count for owner in owners)
+    active_owners = sum(1 for owner in owners if owner.jar_count > 0)
 
     if request.method == 'POST':
         if 'delete_id' in request.POST:
-            owner = get_object_or_404(Owner, id=request.POST['delete_id'])
+            owner = get_object_or_404(Owner, id=request.POST['delete_id'], created_by=request.user)
             owner.delete()
             return redirect('owner_view')
         elif 'update_id' in request.POST:
-            owner = get_object_or_404(Owner, id=request.POST['update_id'])
+            owner = get_object_or_404(Owner, id=request.POST['update_id'], created_by=request.user)
             update_form = OwnerForm(request.POST, instance=owner)
             if update_form.is_valid():
                 update_form.save()
@@ -73,7 +87,6 @@ def owner_view(request):
     return render(request, 'core/owner.html', {
         'owners': owners,
         'form': form,
-        'owner_forms_dict': owner_forms_dict,
         'total_jars': total_jars,
         'active_owners': active_owners,
     })
@@ -81,23 +94,25 @@ def owner_view(request):
 
 @login_required
 def account_view(request):
-    accounts = Account.objects.filter(created_by=request.user)
+    ledger_version = versions.current(request.user.pk)
+    # Balance and jar count come from the joined rollup; the card only shows "100+" past 100 transactions.
+    # Evaluated only if the cached account cards miss.
+    accounts = SimpleLazyObject(lambda: rollups.for_accounts(
+        Account.objects.filter(created_by=request.user).annotate(
+            transaction_count=CappedCount(
+                Transaction.objects.filter(jar__account=OuterRef('pk')), TRANSACTION_COUNT_CAP
+            ),
+        )
+    ))
     form = AccountForm()
-    account_forms_dict = {account.id: AccountForm(instance=account) for account in accounts}
-    
-    # Calculate transaction counts for each account
-    account_transaction_counts = {}
-    for account in accounts:
-        transaction_count = Transaction.objects.filter(jar__account=account).count()
-        account_transaction_counts[account.id] = transaction_count
 
     if request.method == 'POST':
         if 'delete_id' in request.POST:
-            account = get_object_or_404(Account, id=request.POST['delete_id'])
+            account = get_object_or_404(Account, id=request.POST['delete_id'], created_by=request.user)
             account.delete()
             return redirect('account_view')
         elif 'update_id' in request.POST:
-            account = get_object_or_404(Account, id=request.POST['update_id'])
+            account = get_object_or_404(Account, id=request.POST['update_id'], created_by=request.user)
             update_form = AccountForm(request.POST, instance=account)
             if update_form.is_valid():
                 update_form.save()
@@ -113,31 +128,33 @@ def account_view(request):
     return render(request, 'core/account.html', {
         'accounts': accounts,
         'form': form,
-        'account_forms_dict': account_forms_dict,
-        'account_transaction_counts': account_transaction_counts
+        'ledger_version': ledger_version,
+        'fragment_timeout': FRAGMENT_CACHE_TIMEOUT,
     })
 
 
 @login_required
 def account_detail_view(request, account_id):
-    account = get_object_or_404(Account, id=account_id, created_by=request.user)
-    jars = account.jar_set.all()
-    form = JarFormNoAccount()
-    jar_forms_dict = {jar.id: JarFormNoAccount(instance=jar) for jar in jars}
+    accounts = rollups.for_accounts(Account.objects.filter(id=account_id, created_by=request.user))
+    if not accounts:
+        raise Http404
+    account = accounts[0]
+    jars = account.jar_set.select_related('owner')
+    form = JarFormNoAccount(user=request.user)
 
     if request.method == 'POST':
         if 'delete_id' in request.POST:
-            jar = get_object_or_404(Jar, id=request.POST['delete_id'])
+            jar = get_object_or_404(Jar, id=request.POST['delete_id'], account=account)
             jar.delete()
             return redirect(reverse('account_detail', args=[account_id]))
         elif 'update_id' in request.POST:
-            jar = get_object_or_404(Jar, id=request.POST['update_id'])
-            update_form = JarFormNoAccount(request.POST, instance=jar)
+            jar = get_object_or_404(Jar, id=request.POST['update_id'], account=account)
+            update_form = JarFormNoAccount(request.POST, instance=jar, user=request.user)
             if update_form.is_valid():
                 update_form.save()
                 return redirect(reverse('account_detail', args=[account_id]))
         else:
-            form = JarFormNoAccount(request.POST)
+            form = JarFormNoAccount(request.POST, user=request.user)
             if form.is_valid():
                 jar = form.save(commit=False)
                 jar.account = account
@@ -148,10 +165,53 @@ def account_detail_view(request, account_id):
         'account': account,
         'jars': jars,
         'form': form,
-        'jar_forms_dict': jar_forms_dict
     })
 
 
+MODAL_ACTIONS = ('edit', 'delete')
+
+
+def _render_modal(request, kind, action, context):
+    """Render one row's edit or delete modal body, fetched when the modal opens"""
+    if action not in MODAL_ACTIONS:
+        raise Http404
+    return render(request, f'core/fragments/{kind}_{action}.html', context)
+
+
+@login_required
+def owner_modal(request, owner_id, action):
+    owner = get_object_or_404(
+        Owner.objects.annotate(jar_count=Count('jar'), balance=Sum('jar__balance', default=0)),
+        id=owner_id, created_by=request.user,
+    )
+    context = {'owner': owner}
+    if action == 'edit':
+        context['form'] = OwnerForm(instance=owner)
+    return _render_modal(request, 'owner', action, context)
+
+
+@login_required
+def account_modal(request, account_id, action):
+    accounts = rollups.for_accounts(Account.objects.filter(id=account_id, created_by=request.user))
+    if not accounts:
+        raise Http404
+    context = {'account': accounts[0]}
+    if action == 'edit':
+        context['form'] = AccountForm(instance=accounts[0])
+    return _render_modal(request, 'account', action, context)
+
+
+@login_required
+def jar_modal(request, jar_id, action):
+    jar = get_object_or_404(
+        Jar.objects.select_related('owner', 'account'), id=jar_id, account__created_by=request.user,
+    )
+    context = {'jar': jar}
+    if action == 'edit':
+        context['form'] = JarFormNoAccount(instance=jar, user=request.user)
+    return _render_modal(request, 'jar', action, context)
+
+
 @login_required
 def add_incoming_transaction(request, jar_id):
     jar = get_object_or_404(Jar, id=jar_id, account__created_by=request.user)
@@ -204,55 +264,175 @@ def add_outgoing_transaction(request, jar_id):
 
 @login_required
 def jar_transactions(request, jar_id):
-    jar = get_object_or_404(Jar, id=jar_id, account__created_by=request.user)
-    transactions = Transaction.objects.filter(jar=jar)
+    jar = get_object_or_404(Jar.objects.select_related('owner'), id=jar_id, account__created_by=request.user)
+    transactions = checkpoints.jar_transactions(jar.pk)
+    page = paginate(
+        transactions,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        annotate=checkpoints.running_balance(jar.pk),
+    )
     
     return render(request, 'core/jar_transactions.html', {
         'jar': jar,
-        'transactions': transactions
+        'transactions': page.object_list,
+        'page': page,
+        **dashboard.get_ledger_totals(request.user, transactions, ['jar_transactions', jar.pk]),
     })
 
 
+def _id_param(request, name):
+    """An integer id from the query string, None when absent; raises ValueError for anything else"""
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a numeric id")
+
+
+def _filtered_transactions(request):
+    """
+    The user's transactions narrowed by the account/jar/type/search query parameters.
+
+    Raises ``ValueError`` for a non-numeric account or jar id.
+    """
+    account_id = _id_param(request, 'account')
+    jar_id = _id_param(request, 'jar')
+    filters = {
+        'account_filter': request.GET.get('account'),
+        'jar_filter': request.GET.get('jar'),
+        'transaction_type': request.GET.get('type'),
+        'search_query': request.GET.get('q', '').strip(),
+    }
+    
+    # Jars are matched with a subquery rather than a join, so the planner walks
+    # the (created_by, created_at, id) index in page order instead of sorting
+    # every matching row
+    jars = Jar.objects.filter(account__created_by=request.user)
+    if account_id is not None:
+        jars = jars.filter(account_id=account_id)
+    transactions = Transaction.objects.filter(created_by=request.user, jar__in=jars)
+    
+    # Apply filters
+    if jar_id is not None:
+        transactions = transactions.filter(jar_id=jar_id)
+    if filters['transaction_type']:
+        transactions = transactions.filter(transaction_type=filters['transaction_type'])
+    if filters['search_query']:
+        transactions = search.matching(transactions, filters['search_query'])
+    return transactions, filters
+
+
 @login_required
 def all_transactions(request):
     # Get all transactions for the user's jars
     user_accounts = Account.objects.filter(created_by=request.user)
     user_jars = Jar.objects.filter(account__in=user_accounts)
-    transactions = Transaction.objects.filter(jar__in=user_jars).select_related('jar', 'jar__account', 'jar__owner')
+    try:
+        transactions, filters = _filtered_transactions(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
     
-    # Get filter parameters
-    account_filter = request.GET.get('account')
-    jar_filter = request.GET.get('jar')
-    transaction_type = request.GET.get('type')
-    
-    # Apply filters
-    if account_filter:
-        transactions = transactions.filter(jar__account_id=account_filter)
-    if jar_filter:
-        transactions = transactions.filter(jar_id=jar_filter)
-    if transaction_type:
-        transactions = transactions.filter(transaction_type=transaction_type)
-    
-    # Calculate summary statistics
-    total_income = sum(t.amount for t in transactions if t.transaction_type == 'INCOMING')
-    total_expenses = sum(t.amount for t in transactions if t.transaction_type == 'OUTGOING')
-    net_amount = total_income - total_expenses
+    # Summary statistics cover every matching row (cached per ledger version), the page only the visible ones
+    page = paginate(
+        transactions.select_related('jar', 'jar__account', 'jar__owner', 'destination_jar', 'destination_jar__account'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
     
     context = {
-        'transactions': transactions,
+        'transactions': page.object_list,
+        'page': page,
         'user_accounts': user_accounts,
-        'user_jars': user_jars,
-        'total_income': total_income,
-        'total_expenses': total_expenses,
-        'net_amount': net_amount,
-        'account_filter': account_filter,
-        'jar_filter': jar_filter,
-        'transaction_type': transaction_type,
+        'user_jars': user_jars.select_related('account'),
+        **dashboard.get_ledger_totals(request.user, transactions, ['all_transactions', filters]),
+        **filters,
     }
     
     return render(request, 'core/all_transactions.html', context)
 
 
+EXPORT_COLUMNS = [
+    ('created_at', 'created_at'),
+    ('type', 'transaction_type'),
+    ('amount', 'amount'),
+    ('account', 'jar__account__name'),
+    ('jar', 'jar__name'),
+    ('owner', 'jar__owner__name'),
+    ('source_destination', 'source_destination'),
+    ('destination_jar', 'destination_jar__name'),
+    ('description', 'description'),
+]
+EXPORT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File-like object whose write() hands the line straight back to csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+@login_required
+def export_transactions(request):
+    """Stream the filtered transaction history as CSV or JSON Lines"""
+    try:
+        transactions, _ = _filtered_transactions(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in ('csv', 'jsonl'):
+        return HttpResponseBadRequest("format must be csv or jsonl")
+
+    header = [name for name, _ in EXPORT_COLUMNS]
+    rows = (
+        transactions.order_by('-created_at', '-pk')
+        .values_list(*[lookup for _, lookup in EXPORT_COLUMNS])
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    # Timestamps in the site's time zone, as the transaction pages show them
+    rows = ((timezone.localtime(created_at).isoformat(), *rest) for created_at, *rest in rows)
+
+    if export_format == 'csv':
+        writer = csv.writer(_Echo())
+        content = itertools.chain([writer.writerow(header)], (writer.writerow(row) for row in rows))
+        content_type = 'text/csv'
+    else:
+        content = (json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + '\n' for row in rows)
+        content_type = 'application/x-ndjson'
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    filename = f"transactions-{timezone.localdate():%Y%m%d}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+def monthly_report(request):
+    """Month-over-month income and spending read only from the daily buckets"""
+    group = request.GET.get('group', 'jar')
+    if group not in aggregates.REPORT_GROUPS:
+        group = 'jar'
+    try:
+        months = min(max(int(request.GET.get('months', 12)), 1), 60)
+    except ValueError:
+        months = 12
+    
+    # The window ends at the current month, so the date is part of the key
+    key = versions.cache_key(f"monthly-report:{group}:{months}:{timezone.localdate()}", request.user.pk)
+    rows = caching.get_or_compute(
+        key, lambda: list(aggregates.monthly_report(request.user, group=group, months=months)), REPORT_CACHE_TIMEOUT,
+    )
+
+    return render(request, 'core/monthly_report.html', {
+        'rows': rows,
+        'group': group,
+        'months': months,
+    })
+
+
 @login_required
 def transfer_money(request):
     if request.method == 'POST':
@@ -268,8 +448,8 @@ def transfer_money(request):
     else:
         form = TransferForm(user=request.user)
     
-    # Get user's jars for balance display
-    user_jars = Jar.objects.filter(account__created_by=request.user).select_related('account', 'owner')
+    # The balance sidebar shows the same cached jars as the form's choices
+    user_jars = form.jars
     
     context = {
         'form': form,
@@ -277,3 +457,24 @@ def transfer_money(request):
     }
     
     return render(request, 'core/transfer_money.html', context)
+
+
+@login_required
+def batch_transfer(request):
+    """Fund several destination jars from one source jar in a single transaction"""
+    if request.method == 'POST':
+        form = BatchTransferForm(request.POST, user=request.user)
+        if form.is_valid():
+            try:
+                form.save(request.user)
+                return redirect('all_transactions')
+            except ValueError as e:
+                form.add_error(None, str(e))
+    else:
+        form = BatchTransferForm(user=request.user)
+
+    return render(request, 'core/batch_transfer.html', {
+        'form': form,
+        'legs': form.legs,
+        'user_jars': form.jars,
+    })
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 from decouple import config
 import dj_database_url
@@ -52,6 +53,7 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -90,9 +92,30 @@ WSGI_APPLICATION = 'www.wsgi.application'
 
 DATABASE_URL = config('DATABASE_URL', default=None)
 
+# PostgreSQL: DB_POOL=True hands connections to a psycopg 3 pool shared by the
+# worker's threads (Django requires CONN_MAX_AGE=0 then). Without a pool,
+# connections persist for DB_CONN_MAX_AGE seconds and are health-checked
+# before reuse so a dropped connection doesn't fail the next request.
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=600, cast=int)
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+DB_POOL_MIN_SIZE = config('DB_POOL_MIN_SIZE', default=2, cast=int)
+DB_POOL_MAX_SIZE = config('DB_POOL_MAX_SIZE', default=10, cast=int)
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=10, cast=int)
+
+# SQLite: WAL lets readers run alongside the single writer, IMMEDIATE
+# transactions take the write lock up front (a deferred transaction that
+# upgrades to a write fails with "database is locked" instead of waiting) and
+# busy_timeout makes writers queue for the lock rather than error.
+SQLITE_BUSY_TIMEOUT = config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int)
+SQLITE_MMAP_SIZE = config('SQLITE_MMAP_SIZE', default=128 * 1024 * 1024, cast=int)
+
 if DATABASE_URL:
     DATABASES = {
-        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600)
+        'default': dj_database_url.parse(
+            DATABASE_URL,
+            conn_max_age=0 if DB_POOL else DB_CONN_MAX_AGE,
+            conn_health_checks=True,
+        )
     }
 else:
     DATABASES = {
@@ -102,6 +125,78 @@ else:
         }
     }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql' and DB_POOL:
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': DB_POOL_MIN_SIZE,
+        'max_size': DB_POOL_MAX_SIZE,
+        'timeout': DB_POOL_TIMEOUT,
+    }
+elif DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT};'
+            f'PRAGMA mmap_size={SQLITE_MMAP_SIZE};'
+        ),
+    })
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Every gunicorn worker must see the same cache (ledger versions, cached
+# summaries, stampede locks). REDIS_URL selects Redis; otherwise CACHE_BACKEND
+# picks a file-based (default) or database cache. 'locmem' is per-process and
+# only suitable for a single worker. Stampede locks are only exclusive on Redis
+# (and locmem); on the file and database caches they are best-effort.
+
+REDIS_URL = config('REDIS_URL', default=None)
+CACHE_BACKEND = config('CACHE_BACKEND', default='file')
+CACHE_TIMEOUT = config('CACHE_TIMEOUT', default=300, cast=int)
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif CACHE_BACKEND == 'db':
+    # Create the table with `python manage.py createcachetable`
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'core_cache',
+        }
+    }
+elif CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_DIR', default=os.path.join(BASE_DIR, '.cache')),
+            'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int)},
+        }
+    }
+
+# Tests must not read entries a previous run (or the dev server) left in a
+# persistent cache; tests that exercise caching override this with locmem.
+if sys.argv[1:2] == ['test']:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        }
+    }
+
+for _cache in CACHES.values():
+    _cache.update(KEY_PREFIX='balance_jar', TIMEOUT=CACHE_TIMEOUT)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -187,6 +282,19 @@ if not DEBUG:
     SECURE_BROWSER_XSS_FILTER = True
     X_FRAME_OPTIONS = 'DENY'
 
+# Async read views for ASGI (uvicorn) deployments. WhiteNoise is sync-only and
+# would push every request back through a thread, so in this mode static
+# files must be served by the front-end web server (see DEPLOYMENT.md).
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+if ASYNC_VIEWS:
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
+# Per-request query/latency metrics (opt-in), scraped from /metrics
+REQUEST_METRICS = config('REQUEST_METRICS', default=False, cast=bool)
+REQUEST_METRICS_N_PLUS_ONE_THRESHOLD = config('REQUEST_METRICS_N_PLUS_ONE_THRESHOLD', default=5, cast=int)
+# /metrics answers only requests with `Authorization: Bearer <token>`; unset disables it
+REQUEST_METRICS_TOKEN = config('REQUEST_METRICS_TOKEN', default='')
+
 # Logging configuration
 LOGGING = {
     'version': 1,